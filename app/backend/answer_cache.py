@@ -0,0 +1,130 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.sports import detect_sports
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    query = unicodedata.normalize("NFC", query).casefold()
+    return " ".join(_PUNCTUATION.sub(" ", query).split())
+
+
+class AnswerCache:
+    """
+    Two-tier cache of /query responses.
+
+    The exact tier is keyed on the normalized query text. The semantic tier
+    serves a cached response when the cosine distance between the new query
+    embedding and a cached one is at most `max_distance` and both name the
+    same sports: "co nowego w tenisie" and "co nowego w siatkówce" embed
+    almost identically but must not share an answer. Entries expire after
+    `ttl_seconds`, and the whole cache is dropped when `generation_source()`
+    changes, i.e. whenever the RAG updater stores new documents.
+    """
+
+    def __init__(self, embeddings, generation_source=None, ttl_seconds=300.0, max_distance=0.04,
+                 max_entries=1000):
+        self.embeddings = embeddings
+        self.generation_source = generation_source or (lambda: 0)
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._matrix_sports = []
+        self._generation = None
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0,
+                      "saved_seconds": 0.0}
+
+    def _check_generation(self):
+        generation = self.generation_source()
+        if generation != self._generation:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix = None
+            self._generation = generation
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["stored_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _nearest(self, vector, sports):
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            if not self._matrix_keys:
+                return None, None
+            self._matrix = np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+            self._matrix_sports = [self._entries[key]["sports"] for key in self._matrix_keys]
+        distances = 1.0 - self._matrix @ vector
+        distances[[entry_sports != sports for entry_sports in self._matrix_sports]] = np.inf
+        best = int(np.argmin(distances))
+        return self._matrix_keys[best], float(distances[best])
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, query, vector=None):
+        """
+        Returns (response, tier, query_vector). `response` is None on a miss;
+        the query vector is handed back so `store` does not embed twice.
+        A precomputed query embedding can be passed as `vector`.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._check_generation()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                self.stats["saved_seconds"] += entry["elapsed"]
+                return entry["response"], "exact", entry["vector"]
+            if self.max_distance <= 0:
+                self.stats["misses"] += 1
+                return None, None, None
+
+        vector = self._normalize(self.embeddings.embed_query(query) if vector is None else vector)
+
+        with self._lock:
+            nearest_key, distance = self._nearest(vector, detect_sports(query))
+            if nearest_key is not None and distance <= self.max_distance:
+                entry = self._entries[nearest_key]
+                self.stats["semantic_hits"] += 1
+                self.stats["saved_seconds"] += entry["elapsed"]
+                return entry["response"], "semantic", vector
+            self.stats["misses"] += 1
+        return None, None, vector
+
+    def store(self, query, vector, response, elapsed):
+        key = normalize_query(query)
+        vector = self._normalize(self.embeddings.embed_query(query) if vector is None else vector)
+        with self._lock:
+            self._check_generation()
+            self._entries[key] = {"response": response, "vector": vector, "sports": detect_sports(query),
+                                  "elapsed": elapsed, "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return dict(self.stats, entries=len(self._entries),
+                        hit_ratio=hits / lookups if lookups else 0.0)
@@ -1,10 +1,17 @@
 import os
-from flask import Flask, request, jsonify, json
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import time
+from flask import Flask, Response, request, jsonify, json, stream_with_context
+from langchain_openai import ChatOpenAI
 from langchain_chroma import Chroma
-from langchain.chains import RetrievalQA
-from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
+from rag.config import get_embeddings, embedding_signature, collection_dimension
+from rag.ingest_state import load_state, read_generation, check_embedding_signature
+from rag.digests import DigestStore
+from backend.answer_cache import AnswerCache
+from backend.batch import answer_batch
+from backend.conversation import ConversationStore, Turn
+from backend.metrics import StageTimer, render_metrics
+from backend.qa import build_retriever, answer_question, stream_answer
 
 app = Flask(__name__)
 load_dotenv()
@@ -13,45 +20,134 @@ if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY nie jest ustawione w środowisku")
 
 VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", "data/vectorstore/chroma")
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+# Cosine distance under which a new question is served the answer of a cached one naming the same sports;
+# 0 disables the semantic tier
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.04"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# /query/batch: questions per request, parallel LLM calls per request and the time limit of each call
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_ITEM_TIMEOUT_SECONDS = float(os.getenv("BATCH_ITEM_TIMEOUT_SECONDS", "60"))
+# Conversation memory for requests with a "session_id"; an empty path disables it
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "data/cache/conversations.sqlite")
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "4"))
+# Serve generic "what's new in <sport>" questions from the digests the updater precomputes
+DIGESTS = os.getenv("DIGESTS", "1") == "1"
 
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-vectorstore = Chroma(
-    persist_directory=VECTORSTORE_DIR,
-    embedding_function=embeddings
-)
+# Same backend as the updater (EMBEDDING_BACKEND); a store built with other embeddings is refused below
+embeddings = get_embeddings()
 
-llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0, model_name="gpt-4o-mini")
+def open_vectorstore(max_attempts=5, delay_seconds=1.0):
+    # Several workers (and the updater) may open the same SQLite-backed store at once;
+    # a transient "database is locked" during startup is retried instead of failing the worker
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return Chroma(
+                persist_directory=VECTORSTORE_DIR,
+                embedding_function=embeddings
+            )
+        except Exception as e:
+            if attempt == max_attempts:
+                raise
+            print(f"Otwarcie bazy wektorowej nie powiodło się (próba {attempt}/{max_attempts}): {e}")
+            time.sleep(delay_seconds * attempt)
 
+vectorstore = open_vectorstore()
+check_embedding_signature(load_state(VECTORSTORE_DIR), embedding_signature(embeddings),
+                          collection_dimension(vectorstore))
 
-qa_template_content = """Jesteś pomocnym asystentem AI, specjalizującym się WYŁĄCZNIE w tematyce sportowej.
-Użyj swojej ogólnej wiedzy o sporcie, aby odpowiadać na szerokie pytania i udzielać podstawowych informacji.
-Kiedy jednak potrzebujesz informacji o konkretnych wydarzeniach, aktualnościach lub szczegółach, **priorytetowo bazuj na dostarczonych dokumentach sportowych (Kontekst).**
-Połącz swoją wiedzę z informacjami z Kontekstu, aby udzielić jak najbardziej kompletnej i trafnej odpowiedzi.
+llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0, model_name="gpt-4o-mini")
 
-Niezależnie od dokładnego sformułowania pytania o sport (np. "nowinki", "co się ostatnio działo", "aktualności", "opowiedz o"), zawsze staraj się znaleźć i podać najbardziej istotne i dostępne informacje sportowe, wykorzystując zarówno swoją wiedzę, jak i dostarczony kontekst.
+retriever = build_retriever(vectorstore, VECTORSTORE_DIR)
 
-Jeśli pytanie użytkownika NIE dotyczy sportu, LUB jeśli mimo interpretacji pytania jako prośby o sportowe informacje (po przeszukaniu zarówno swojej wiedzy, jak i Kontekstu), dostarczone dokumenty sportowe ABOSOLUTNIE NIE zawierają ŻADNYCH RELEWANTNYCH danych, a Twoja wiedza ogólna również nie pozwala na udzielenie satysfakcjonującej odpowiedzi, poinformuj go, że jesteś wyspecjalizowanym asystentem sportowym i nie możesz odpowiedzieć na to pytanie, lub że nie masz wystarczających informacji sportowych na ten temat. Zachowaj uprzejmy ton.
-Odpowiadaj zwięźle i na temat, trzymając się ścisłej tematyki sportowej i wykorzystując każdą pasującą informację.
+answer_cache = AnswerCache(
+    embeddings,
+    generation_source=lambda: read_generation(VECTORSTORE_DIR),
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_distance=ANSWER_CACHE_MAX_DISTANCE,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES
+)
 
-Kontekst:
-{context}
+digests = DigestStore(VECTORSTORE_DIR) if DIGESTS else None
 
-Pytanie użytkownika:
-{question}
+conversations = ConversationStore(
+    CONVERSATION_DB_PATH,
+    max_sessions=CONVERSATION_MAX_SESSIONS,
+    ttl_seconds=CONVERSATION_TTL_SECONDS,
+    max_turns=CONVERSATION_MAX_TURNS
+) if CONVERSATION_DB_PATH else None
 
-Odpowiedź:"""
-QA_PROMPT = PromptTemplate(template=qa_template_content, input_variables=["context", "question"])
-
-qa_chain = RetrievalQA.from_llm(
-    llm,
-    retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
-    return_source_documents=True,
-    prompt=QA_PROMPT
-)
+def shutdown():
+    """Releases per-worker resources; called by gunicorn when a worker exits."""
+    if hasattr(embeddings, "close"):
+        embeddings.close()
+    if conversations is not None:
+        conversations.close()
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"}), 200
+    # Readiness: only report ok once this worker can actually read the Chroma collection
+    try:
+        documents = vectorstore._collection.count()
+    except Exception as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ok", "documents": documents}), 200
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "embedding_cache": embeddings.stats() if hasattr(embeddings, "stats") else None,
+        "answer_cache": answer_cache.get_stats(),
+        "digests": digests.stats() if digests is not None else None
+    }), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+def debug_requested(data):
+    # Per-request stage breakdown, enabled with {"debug": true} in the body or ?debug=1
+    return bool(data.get("debug")) or request.args.get("debug") == "1"
+
+def lookup_answer(query_text, timer):
+    if digests is not None:
+        with timer.stage("digest"):
+            sport, digest = digests.lookup(query_text)
+        if digest:
+            timer.digest_hit(sport)
+            return digest, "digest", None
+    with timer.stage("answer_cache"):
+        cached, tier, query_vector = answer_cache.lookup(query_text)
+    timer.cache_lookup(tier)
+    return cached, tier, query_vector
+
+def start_turn(data, query_text, timer):
+    """Returns (session_id, turn); without a session every question is answered on its own."""
+    session_id = data.get("session_id")
+    if conversations is None or not isinstance(session_id, str) or not session_id:
+        return None, Turn(query_text, query_text, query_text)
+    session_id = session_id[:128]
+    return session_id, conversations.start_turn(llm, session_id, query_text, timer)
+
+def lookup_turn(turn, timer):
+    # Answers built on the previous turn's documents depend on the conversation, so they bypass the cache
+    if turn.search_question is None:
+        return None, None, None
+    return lookup_answer(turn.search_question, timer)
+
+def retrieve_turn(turn, timer):
+    if turn.docs is not None:
+        timer.documents_reused(len(turn.docs))
+        return turn.docs
+    return retriever.invoke(turn.search_question, timer=timer)
+
+def finish_turn(session_id, turn, answer, retrieved):
+    if session_id is not None:
+        conversations.append(session_id, turn.search_question or turn.question, answer, retrieved)
 
 @app.route("/query", methods=["POST"])
 def query():
@@ -60,29 +156,134 @@ def query():
         return jsonify({"error": "Proszę podać pole 'query' w body requestu"}), 400
 
     query_text = data["query"]
+    timer = StageTimer("query")
     
     try:
-        result = qa_chain({"query": query_text})
-        answer = result.get("result")
-        docs = result.get("source_documents", [])
-        sources = []
-        for doc in docs:
-            sources.append(doc.metadata)
-
-        response_data = {
-            "answer": answer,
-            "sources": sources
-        }
+        session_id, turn = start_turn(data, query_text, timer)
+        cached, tier, query_vector = lookup_turn(turn, timer)
+        # A cached answer comes without its documents: None keeps the session's previous ones
+        retrieved = None
+        if cached:
+            response_data = dict(cached, cached=tier)
+        else:
+            started = time.monotonic()
+            retrieved = retrieve_turn(turn, timer)
+            answer, docs = answer_question(llm, retriever, turn.search_question or turn.question, timer,
+                                           retrieved=retrieved, prompt_question=turn.prompt_question)
+            sources = []
+            for doc in docs:
+                sources.append(doc.metadata)
+
+            response_data = {
+                "answer": answer,
+                "sources": sources
+            }
+            if turn.search_question is not None:
+                answer_cache.store(turn.search_question, query_vector, response_data, time.monotonic() - started)
+        finish_turn(session_id, turn, response_data["answer"], retrieved)
 
+        timer.finish()
+        if debug_requested(data):
+            response_data = dict(response_data, timings=timer.breakdown())
         return app.response_class(
             response=json.dumps(response_data, ensure_ascii=False),
             status=200,
             mimetype='application/json'
         )
     except Exception as e:
+        timer.finish(error=True)
         print(f"Błąd podczas obsługi zapytania: {e}") 
         return jsonify({"error": str(e)}), 500
 
+@app.route("/query/batch", methods=["POST"])
+def query_batch():
+    """
+    Answers a list of questions, {"queries": [...]}, in one request.
+    Returns {"results": [...]} in input order; a failed or timed out
+    question gets {"error": ...} without failing the others.
+    """
+    data = request.get_json(silent=True)
+    queries = data.get("queries") if data else None
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return jsonify({"error": "Proszę podać pole 'queries' (niepusta lista pytań) w body requestu"}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({"error": f"Maksymalnie {BATCH_MAX_QUERIES} pytań w jednym requeście"}), 400
+
+    timer = StageTimer("query_batch")
+    try:
+        results = answer_batch(llm, retriever, embeddings, answer_cache, queries, timer,
+                               concurrency=BATCH_CONCURRENCY, item_timeout=BATCH_ITEM_TIMEOUT_SECONDS,
+                               digests=digests)
+    except Exception as e:
+        timer.finish(error=True)
+        print(f"Błąd podczas obsługi zapytania: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    timer.finish()
+    response_data = {"results": results}
+    if debug_requested(data):
+        response_data["timings"] = timer.breakdown()
+    return app.response_class(
+        response=json.dumps(response_data, ensure_ascii=False),
+        status=200,
+        mimetype='application/json'
+    )
+
+@app.route("/query/stream", methods=["POST"])
+def query_stream():
+    """
+    Streaming variant of /query. Emits newline-delimited JSON events:
+    {"type": "sources"}, then {"type": "token"} per answer token, then
+    {"type": "done"} with the full answer (or {"type": "error"}).
+    With debug enabled the "done" event also carries the stage timings.
+    Like /query it accepts an optional "session_id" for follow-up questions.
+    """
+    data = request.get_json(silent=True)
+    if not data or "query" not in data:
+        return jsonify({"error": "Proszę podać pole 'query' w body requestu"}), 400
+
+    query_text = data["query"]
+    debug = debug_requested(data)
+
+    def generate():
+        timer = StageTimer("query_stream")
+        try:
+            session_id, turn = start_turn(data, query_text, timer)
+            cached, tier, query_vector = lookup_turn(turn, timer)
+            retrieved = None
+            started = time.monotonic()
+            if cached:
+                events = [
+                    {"type": "sources", "sources": cached["sources"]},
+                    {"type": "token", "token": cached["answer"]},
+                    {"type": "done", "answer": cached["answer"], "cached": tier}
+                ]
+            else:
+                retrieved = retrieve_turn(turn, timer)
+                events = stream_answer(llm, retriever, turn.search_question or turn.question, timer,
+                                       retrieved=retrieved, prompt_question=turn.prompt_question)
+
+            sources = []
+            for event in events:
+                if event["type"] == "sources":
+                    sources = event["sources"]
+                elif event["type"] == "done":
+                    if not cached and turn.search_question is not None:
+                        answer_cache.store(turn.search_question, query_vector,
+                                           {"answer": event["answer"], "sources": sources},
+                                           time.monotonic() - started)
+                    finish_turn(session_id, turn, event["answer"], retrieved)
+                    timer.finish()
+                    if debug:
+                        event = dict(event, timings=timer.breakdown())
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            timer.finish(error=True)
+            print(f"Błąd podczas obsługi zapytania: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), content_type="application/x-ndjson; charset=utf-8")
+
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
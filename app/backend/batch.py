@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from backend.qa import build_prompt, complete, prepare_context
+from rag.embedding_cache import embed_queries
+
+
+def run_bounded(fn, items, concurrency, item_timeout):
+    """
+    Runs fn(item) for every item on at most `concurrency` threads and
+    returns (result, error) pairs in input order. An item still running
+    `item_timeout` seconds after it started is reported as timed out; its
+    thread is left to finish in the background.
+    """
+    outcomes = [None] * len(items)
+    started = {}
+
+    def run(index):
+        started[index] = time.monotonic()
+        return fn(items[index])
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        pending = {executor.submit(run, index): index for index in range(len(items))}
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[index] + item_timeout for index in pending.values() if index in started]
+            timeout = max(0.0, min(deadlines) - now) if deadlines else item_timeout
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                outcomes[index] = (None, error) if error else (future.result(), None)
+
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if index in started and now - started[index] >= item_timeout:
+                    del pending[future]
+                    outcomes[index] = (None, TimeoutError(f"Przekroczono limit czasu {item_timeout:g} s"))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return outcomes
+
+
+def answer_batch(llm, retriever, embeddings, answer_cache, queries, timer, concurrency=8, item_timeout=60.0,
+                 digests=None):
+    """
+    Answers many questions at once: precomputed sport digests for generic
+    questions, one embeddings request for the rest, answer cache lookups
+    with those vectors, grouped vector searches for the misses and LLM calls
+    fanned out with bounded concurrency. Returns one response (or
+    {"error": ...}) per question, in input order.
+    """
+    results = [None] * len(queries)
+    pending = list(range(len(queries)))
+    if digests is not None:
+        with timer.stage("digest"):
+            for index, query in enumerate(queries):
+                sport, digest = digests.lookup(query)
+                if digest:
+                    timer.digest_hit(sport)
+                    results[index] = dict(digest, cached="digest")
+            pending = [index for index in pending if results[index] is None]
+    if not pending:
+        return results
+
+    with timer.stage("embed"):
+        vectors = dict(zip(pending, embed_queries(embeddings, [queries[i] for i in pending])))
+
+    misses = []
+    with timer.stage("answer_cache"):
+        for index in pending:
+            cached, tier, _ = answer_cache.lookup(queries[index], vector=vectors[index])
+            timer.cache_lookup(tier)
+            if cached:
+                results[index] = dict(cached, cached=tier)
+            else:
+                misses.append(index)
+    if not misses:
+        return results
+
+    docs_per_query = retriever.retrieve_many([queries[i] for i in misses], [vectors[i] for i in misses], timer)
+    docs_per_query = [prepare_context(docs, queries[i], timer) for i, docs in zip(misses, docs_per_query)]
+    with timer.stage("prompt"):
+        prompts = [build_prompt(docs, queries[i]) for i, docs in zip(misses, docs_per_query)]
+
+    def generate(prompt):
+        started = time.monotonic()
+        return complete(llm, prompt) + (time.monotonic() - started,)
+
+    with timer.stage("llm"):
+        outcomes = run_bounded(generate, prompts, concurrency, item_timeout)
+
+    for index, docs, (outcome, error) in zip(misses, docs_per_query, outcomes):
+        if error is not None:
+            results[index] = {"error": str(error) or type(error).__name__}
+            continue
+        answer, prompt_tokens, completion_tokens, elapsed = outcome
+        timer.tokens(prompt_tokens, completion_tokens)
+        response = {"answer": answer, "sources": [doc.metadata for doc in docs]}
+        answer_cache.store(queries[index], vectors[index], response, elapsed)
+        results[index] = response
+    return results
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+
+from rag.bm25_index import tokenize
+from rag.chunking import count_tokens, split_sentences, truncate_tokens
+
+
+def _merge_by_url(docs):
+    """
+    One document per source URL, in rank order. Chunks of the same article
+    are joined in chunk order, skipping sentences already seen (duplicate
+    chunks and the overlap between neighbouring chunks).
+    """
+    groups = OrderedDict()
+    for doc in docs:
+        url = (doc.metadata or {}).get("url") or id(doc)
+        groups.setdefault(url, []).append(doc)
+
+    merged = []
+    for group in groups.values():
+        seen, sentences = set(), []
+        for doc in sorted(group, key=lambda d: (d.metadata or {}).get("chunk_index", 0)):
+            for sentence in split_sentences(doc.page_content):
+                key = " ".join(sentence.split()).casefold()
+                if key not in seen:
+                    seen.add(key)
+                    sentences.append(sentence)
+        if sentences:
+            merged.append((group[0].metadata, sentences))
+    return merged
+
+
+def _select_passages(sentences, query_terms, budget):
+    """
+    Keeps the sentences sharing the most terms with the query (the lead
+    sentence wins ties) that fit in `budget` tokens, in their original order.
+    """
+    tokens = [count_tokens(sentence) for sentence in sentences]
+    scores = [len(query_terms.intersection(tokenize(sentence))) + (0.5 if index == 0 else 0.0)
+              for index, sentence in enumerate(sentences)]
+    chosen, used = [], 0
+    for index in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+        if used + tokens[index] <= budget:
+            chosen.append(index)
+            used += tokens[index]
+    if not chosen:
+        # Even the best sentence is longer than the budget
+        best = max(range(len(sentences)), key=lambda i: (scores[i], -i))
+        return truncate_tokens(sentences[best], budget)
+    return " ".join(sentences[index] for index in sorted(chosen))
+
+
+def build_context(docs, question, max_tokens):
+    """
+    Context builder between retrieval and generation: drops duplicate
+    sources by URL, then fits the documents into `max_tokens` (0 = no
+    limit). The budget is shared fairly: short documents are kept whole and
+    the rest of the budget is split between the longer ones, which are cut
+    down to their most query-relevant sentences.
+    Returns (documents, stats) where stats reports the tokens saved.
+    """
+    tokens_in = sum(count_tokens(doc.page_content) for doc in docs)
+    merged = [(metadata, sentences, count_tokens("\n".join(sentences)))
+              for metadata, sentences in _merge_by_url(docs)]
+
+    texts = ["\n".join(sentences) for _, sentences, _ in merged]
+    if max_tokens:
+        query_terms = set(tokenize(question))
+        remaining = max_tokens
+        by_length = sorted(range(len(merged)), key=lambda i: merged[i][2])
+        for position, index in enumerate(by_length):
+            share = remaining // (len(merged) - position)
+            _, sentences, length = merged[index]
+            if length > share:
+                texts[index] = _select_passages(sentences, query_terms, share) if share > 0 else ""
+            remaining -= count_tokens(texts[index]) if length > share else length
+
+    context_docs = [Document(page_content=text, metadata=metadata)
+                    for (metadata, _, _), text in zip(merged, texts) if text]
+    tokens_out = sum(count_tokens(doc.page_content) for doc in context_docs)
+    return context_docs, {
+        "documents_in": len(docs),
+        "documents_out": len(context_docs),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": max(0, tokens_in - tokens_out)
+    }
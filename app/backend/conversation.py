@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+
+from rag.bm25_index import tokenize
+from rag.chunking import truncate_tokens
+from rag.sports import detect_sports
+
+condense_template_content = """Na podstawie poniższej rozmowy przeformułuj pytanie uzupełniające użytkownika tak, aby było samodzielnym pytaniem, zrozumiałym bez znajomości rozmowy.
+Zachowaj nazwiska, drużyny, rozgrywki i wydarzenia, do których się odnosi. Zwróć wyłącznie przeformułowane pytanie.
+
+Rozmowa:
+{history}
+
+Pytanie uzupełniające: {question}
+
+Samodzielne pytanie:"""
+CONDENSE_PROMPT = PromptTemplate(template=condense_template_content, input_variables=["history", "question"])
+
+# Question words and pronouns that say nothing about which documents a follow-up needs
+FOLLOW_UP_WORDS = set(tokenize(
+    "kto kogo komu kiedy gdzie ile jaki jaka jakie jakim jakiego ktory ktora ktore ktorego dlaczego czemu "
+    "wiecej jeszcze powiedz opowiedz on ona oni one ono jego jej ich nim niej tym tego tej tamten wtedy potem"
+))
+
+
+def format_history(history):
+    return "\n".join(f"Użytkownik: {turn['question']}\nAsystent: {turn['answer']}" for turn in history)
+
+
+def condense_question(llm, history, question):
+    message = llm.invoke(CONDENSE_PROMPT.format(history=format_history(history), question=question))
+    standalone = getattr(message, "content", message).strip()
+    return standalone or question
+
+
+def refers_to_previous(question, docs, min_overlap=0.5):
+    """
+    True when a follow-up can be answered from the previous turn's documents:
+    it names no sport they do not cover, and most of its content words
+    (question words and pronouns aside) occur in them.
+    """
+    if not docs:
+        return False
+    covered_sports = {(doc.metadata or {}).get("sport") for doc in docs}
+    if any(sport not in covered_sports for sport in detect_sports(question)):
+        return False
+    terms = set(tokenize(question)) - FOLLOW_UP_WORDS
+    if not terms:
+        return True
+    doc_terms = set()
+    for doc in docs:
+        doc_terms.update(tokenize(doc.page_content))
+    return len(terms & doc_terms) / len(terms) >= min_overlap
+
+
+class Turn:
+    """
+    How one question of a conversation is answered. `search_question` is
+    used for the answer cache and retrieval (None when the previous turn's
+    `docs` are reused); `prompt_question` is what the LLM is asked.
+    """
+
+    def __init__(self, question, search_question, prompt_question, docs=None, kind="first"):
+        self.question = question
+        self.search_question = search_question
+        self.prompt_question = prompt_question
+        self.docs = docs
+        self.kind = kind
+
+
+class ConversationStore:
+    """
+    Per-session history of recent turns and the documents retrieved for
+    the last one, kept in SQLite so all gunicorn workers see the same
+    sessions. Sessions expire after `ttl_seconds` of inactivity and the
+    least recently used ones are evicted beyond `max_sessions`; only the
+    last `max_turns` turns are kept, with answers cut to `answer_tokens`.
+    """
+
+    def __init__(self, path, max_sessions=10_000, ttl_seconds=3600.0, max_turns=4, answer_tokens=150):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.answer_tokens = answer_tokens
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, docs TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        """Returns (history, docs) of a live session, or ([], []) for a new or expired one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, docs, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.ttl_seconds:
+            return [], []
+        docs = [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in json.loads(row[1])]
+        return json.loads(row[0]), docs
+
+    def append(self, session_id, question, answer, docs=None):
+        """Records a turn; `docs=None` keeps the documents of the previous turn."""
+        history, previous_docs = self.get(session_id)
+        history = history + [{"question": question, "answer": truncate_tokens(answer, self.answer_tokens)}]
+        docs = previous_docs if docs is None else docs
+        payload = json.dumps([{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+                             ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, history, docs, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(history[-self.max_turns:], ensure_ascii=False), payload, now)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+            count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            if count > self.max_sessions:
+                # Evict down to 90% so we don't pay for an eviction on every new session
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN "
+                    "(SELECT session_id FROM sessions ORDER BY updated_at ASC LIMIT ?)",
+                    (count - int(self.max_sessions * 0.9),)
+                )
+            self._conn.commit()
+
+    def start_turn(self, llm, session_id, question, timer):
+        """
+        Plans the answer to `question` in the context of the session. A
+        follow-up that refers to the previous documents reuses them and
+        gets the compact history in its prompt, skipping embedding and
+        search; any other follow-up is rewritten into a standalone question.
+        """
+        history, docs = self.get(session_id)
+        if not history:
+            turn = Turn(question, question, question)
+        elif refers_to_previous(question, docs):
+            prompt_question = f"Dotychczasowa rozmowa:\n{format_history(history)}\n\nBieżące pytanie: {question}"
+            turn = Turn(question, None, prompt_question, docs=docs, kind="reused")
+        else:
+            with timer.stage("condense"):
+                standalone = condense_question(llm, history, question)
+            turn = Turn(question, standalone, standalone, kind="condensed")
+        timer.conversation_turn(turn.kind)
+        return turn
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('BACKEND_PORT', '5000')}"
+# Threaded workers: a request blocked on a slow OpenAI call holds one thread, not the whole worker
+worker_class = "gthread"
+workers = int(os.getenv("BACKEND_WORKERS", "2"))
+threads = int(os.getenv("BACKEND_THREADS", "8"))
+timeout = int(os.getenv("BACKEND_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("BACKEND_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# No preload: every worker builds its own embeddings, Chroma client and SQLite handles after fork
+preload_app = False
+accesslog = "-"
+errorlog = "-"
+
+
+def child_exit(server, worker):
+    # Drop the live-gauge files of a dead worker; its counters and histograms stay in the merged /metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    backend_app = sys.modules.get("backend.app")
+    if backend_app is not None:
+        backend_app.shutdown()
@@ -0,0 +1,124 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# Latency buckets from a cached answer (~ms) up to a slow LLM completion (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "End-to-end request latency",
+                            ["endpoint"], buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Latency of each query pipeline stage",
+                          ["endpoint", "stage"], buckets=LATENCY_BUCKETS)
+RETRIEVED_DOCUMENTS = Histogram("rag_retrieved_documents", "Documents passed to the LLM per request",
+                                ["endpoint"], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24))
+LLM_TOKENS = Counter("rag_llm_tokens", "Prompt and completion tokens sent to / produced by the LLM",
+                     ["endpoint", "kind"])
+CONTEXT_TOKENS = Counter("rag_context_tokens", "Retrieved tokens kept in / trimmed from the LLM context",
+                         ["endpoint", "kind"])
+ANSWER_CACHE_LOOKUPS = Counter("rag_answer_cache_lookups", "Answer cache lookups by result",
+                               ["endpoint", "result"])
+CONVERSATION_TURNS = Counter("rag_conversation_turns", "Session turns: first question, condensed follow-up "
+                             "or follow-up answered from the previous documents", ["endpoint", "kind"])
+DIGEST_HITS = Counter("rag_digest_hits", "Generic questions answered from a precomputed sport digest",
+                      ["endpoint", "sport"])
+REQUEST_ERRORS = Counter("rag_request_errors", "Requests that failed with an exception", ["endpoint"])
+
+
+class StageTimer:
+    """
+    Collects the per-stage timings and counters of a single request and,
+    when `endpoint` is set, records them in the Prometheus metrics.
+    Passed down the query pipeline (including the retriever) so each stage
+    reports its own time.
+    """
+
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.endpoint:
+            STAGE_SECONDS.labels(self.endpoint, name).observe(seconds)
+
+    def cache_lookup(self, tier):
+        name = f"cache_{tier or 'miss'}"
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self.endpoint:
+            ANSWER_CACHE_LOOKUPS.labels(self.endpoint, tier or "miss").inc()
+
+    def digest_hit(self, sport):
+        self.counts["digest"] = sport
+        if self.endpoint:
+            DIGEST_HITS.labels(self.endpoint, sport).inc()
+
+    def conversation_turn(self, kind):
+        self.counts["turn"] = kind
+        if self.endpoint:
+            CONVERSATION_TURNS.labels(self.endpoint, kind).inc()
+
+    def documents_reused(self, count):
+        self.counts["documents_reused"] = self.counts.get("documents_reused", 0) + count
+
+    def documents(self, count):
+        self.counts["documents"] = self.counts.get("documents", 0) + count
+        if self.endpoint:
+            RETRIEVED_DOCUMENTS.labels(self.endpoint).observe(count)
+
+    def context(self, stats):
+        for name in ("tokens_out", "tokens_saved"):
+            key = f"context_{name}"
+            self.counts[key] = self.counts.get(key, 0) + stats[name]
+        if self.endpoint:
+            CONTEXT_TOKENS.labels(self.endpoint, "kept").inc(stats["tokens_out"])
+            CONTEXT_TOKENS.labels(self.endpoint, "saved").inc(stats["tokens_saved"])
+
+    def tokens(self, prompt_tokens, completion_tokens):
+        self.counts["prompt_tokens"] = self.counts.get("prompt_tokens", 0) + prompt_tokens
+        self.counts["completion_tokens"] = self.counts.get("completion_tokens", 0) + completion_tokens
+        if self.endpoint:
+            LLM_TOKENS.labels(self.endpoint, "prompt").inc(prompt_tokens)
+            LLM_TOKENS.labels(self.endpoint, "completion").inc(completion_tokens)
+
+    def finish(self, error=False):
+        elapsed = time.perf_counter() - self.started
+        if self.endpoint:
+            REQUEST_SECONDS.labels(self.endpoint).observe(elapsed)
+            if error:
+                REQUEST_ERRORS.labels(self.endpoint).inc()
+        return elapsed
+
+    def breakdown(self):
+        """Per-request stage breakdown returned to clients that ask for debug output."""
+        return dict(
+            self.counts,
+            stages_ms={name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            total_ms=round((time.perf_counter() - self.started) * 1000, 2)
+        )
+
+
+def render_metrics():
+    """
+    Returns (body, content_type) in the Prometheus text format. Under
+    gunicorn every worker has its own counters, so when
+    PROMETHEUS_MULTIPROC_DIR is set the values of all workers are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,142 @@
+import os
+import time
+from langchain_core.prompts import PromptTemplate
+from backend.context import build_context
+from backend.metrics import StageTimer
+from rag.bm25_index import ReloadingBM25Index
+from rag.chunking import count_tokens
+from rag.hybrid_retriever import HybridRetriever
+from rag.vector_index import ReloadingVectorIndex
+
+# Documents passed to the LLM, and candidates fetched from each of the dense and BM25 searches
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "4"))
+RETRIEVER_FETCH_K = int(os.getenv("RETRIEVER_FETCH_K", "20"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RECENCY_HALF_LIFE_HOURS = float(os.getenv("RECENCY_HALF_LIFE_HOURS", "48"))
+# Search only the sports a query mentions and only articles from the last N days (0 = no limit). The age limit is
+# off by default: it excludes every chunk stored before scraped_ts existed, however relevant.
+ROUTE_BY_SPORT = os.getenv("ROUTE_BY_SPORT", "1") == "1"
+RETRIEVAL_MAX_AGE_DAYS = float(os.getenv("RETRIEVAL_MAX_AGE_DAYS", "0"))
+# Dense search over the memory-mapped index exported by the updater; Chroma is used until one exists
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "1") == "1"
+# Token budget of the retrieved context put into the prompt (0 = no limit, only duplicate sources are dropped)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+
+qa_template_content = """Jesteś pomocnym asystentem AI, specjalizującym się WYŁĄCZNIE w tematyce sportowej.
+Użyj swojej ogólnej wiedzy o sporcie, aby odpowiadać na szerokie pytania i udzielać podstawowych informacji.
+Kiedy jednak potrzebujesz informacji o konkretnych wydarzeniach, aktualnościach lub szczegółach, **priorytetowo bazuj na dostarczonych dokumentach sportowych (Kontekst).**
+Połącz swoją wiedzę z informacjami z Kontekstu, aby udzielić jak najbardziej kompletnej i trafnej odpowiedzi.
+
+Niezależnie od dokładnego sformułowania pytania o sport (np. "nowinki", "co się ostatnio działo", "aktualności", "opowiedz o"), zawsze staraj się znaleźć i podać najbardziej istotne i dostępne informacje sportowe, wykorzystując zarówno swoją wiedzę, jak i dostarczony kontekst.
+
+Jeśli pytanie użytkownika NIE dotyczy sportu, LUB jeśli mimo interpretacji pytania jako prośby o sportowe informacje (po przeszukaniu zarówno swojej wiedzy, jak i Kontekstu), dostarczone dokumenty sportowe ABOSOLUTNIE NIE zawierają ŻADNYCH RELEWANTNYCH danych, a Twoja wiedza ogólna również nie pozwala na udzielenie satysfakcjonującej odpowiedzi, poinformuj go, że jesteś wyspecjalizowanym asystentem sportowym i nie możesz odpowiedzieć na to pytanie, lub że nie masz wystarczających informacji sportowych na ten temat. Zachowaj uprzejmy ton.
+Odpowiadaj zwięźle i na temat, trzymając się ścisłej tematyki sportowej i wykorzystując każdą pasującą informację.
+
+Kontekst:
+{context}
+
+Pytanie użytkownika:
+{question}
+
+Odpowiedź:"""
+QA_PROMPT = PromptTemplate(template=qa_template_content, input_variables=["context", "question"])
+# Same per-document format RetrievalQA.from_llm used, so answers match those of the former qa_chain
+DOCUMENT_PROMPT = PromptTemplate(input_variables=["page_content"], template="Context:\n{page_content}")
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+def build_retriever(vectorstore, persist_directory):
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        lexical_index=ReloadingBM25Index(persist_directory) if HYBRID_SEARCH else None,
+        vector_index=ReloadingVectorIndex(persist_directory) if VECTOR_INDEX else None,
+        k=RETRIEVER_K,
+        fetch_k=RETRIEVER_FETCH_K,
+        recency_half_life_hours=RECENCY_HALF_LIFE_HOURS,
+        route_by_sport=ROUTE_BY_SPORT,
+        max_age_days=RETRIEVAL_MAX_AGE_DAYS
+    )
+
+
+def format_context(docs):
+    return DOCUMENT_SEPARATOR.join(DOCUMENT_PROMPT.format(page_content=doc.page_content) for doc in docs)
+
+
+def _token_usage(usage, prompt, answer):
+    # Exact counts reported by the API when available, tiktoken estimates otherwise (e.g. fake models)
+    if usage:
+        return usage["input_tokens"], usage["output_tokens"]
+    return count_tokens(prompt), count_tokens(answer)
+
+
+def build_prompt(docs, question):
+    return QA_PROMPT.format(context=format_context(docs), question=question)
+
+
+def complete(llm, prompt, **kwargs):
+    """Calls the LLM; returns (answer, prompt_tokens, completion_tokens)."""
+    message = llm.invoke(prompt, **kwargs)
+    answer = getattr(message, "content", message)
+    return (answer,) + _token_usage(getattr(message, "usage_metadata", None), prompt, answer)
+
+
+def prepare_context(docs, question, timer):
+    """Dedupes and trims retrieved documents to the context budget; returns the documents to cite."""
+    with timer.stage("context"):
+        docs, stats = build_context(docs, question, CONTEXT_MAX_TOKENS)
+    timer.context(stats)
+    timer.documents(len(docs))
+    return docs
+
+
+def _retrieve_and_prompt(retriever, question, timer, retrieved, prompt_question):
+    if retrieved is None:
+        retrieved = retriever.invoke(question, timer=timer)
+    docs = prepare_context(retrieved, question, timer)
+    with timer.stage("prompt"):
+        prompt = build_prompt(docs, prompt_question or question)
+    return docs, prompt
+
+
+def answer_question(llm, retriever, question, timer=None, retrieved=None, prompt_question=None):
+    """
+    Retrieval QA pipeline behind /query: retrieve, build the prompt, call
+    the LLM. Returns (answer, docs); each stage is reported to `timer`.
+    Already `retrieved` documents skip the search, and `prompt_question`
+    replaces the question in the prompt (e.g. with conversation history).
+    """
+    timer = timer or StageTimer()
+    docs, prompt = _retrieve_and_prompt(retriever, question, timer, retrieved, prompt_question)
+    with timer.stage("llm"):
+        answer, prompt_tokens, completion_tokens = complete(llm, prompt)
+    timer.tokens(prompt_tokens, completion_tokens)
+    return answer, docs
+
+
+def stream_answer(llm, retriever, question, timer=None, retrieved=None, prompt_question=None):
+    """
+    Generator of answer events for the streaming endpoint: first the
+    retrieved sources, then answer tokens as the LLM produces them, then the
+    full answer. Works with any model supporting .stream(), e.g. ChatOpenAI
+    or langchain's FakeListChatModel in tests.
+    """
+    timer = timer or StageTimer()
+    docs, prompt = _retrieve_and_prompt(retriever, question, timer, retrieved, prompt_question)
+    yield {"type": "sources", "sources": [doc.metadata for doc in docs]}
+
+    parts = []
+    usage = None
+    started = time.perf_counter()
+    for chunk in llm.stream(prompt):
+        if getattr(chunk, "usage_metadata", None):
+            usage = chunk.usage_metadata
+        token = getattr(chunk, "content", chunk)
+        if token:
+            if not parts:
+                timer.record("llm_first_token", time.perf_counter() - started)
+            parts.append(token)
+            yield {"type": "token", "token": token}
+    timer.record("llm", time.perf_counter() - started)
+    answer = "".join(parts)
+    timer.tokens(*_token_usage(usage, prompt, answer))
+    yield {"type": "done", "answer": answer}
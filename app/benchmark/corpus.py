@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, timedelta
+
+SPORTS = {
+    "pilka-nozna": {
+        "name": "piłce nożnej",
+        "teams": ["Legia Warszawa", "Lech Poznań", "Raków Częstochowa", "Jagiellonia Białystok", "Pogoń Szczecin",
+                  "Górnik Zabrze", "Barcelona", "Real Madryt", "Bayern Monachium", "Manchester City"],
+        "players": ["Robert Lewandowski", "Piotr Zieliński", "Nicola Zalewski", "Jakub Kiwior", "Kacper Urbański"],
+        "events": ["strzelił gola w {minute}. minucie", "asystował przy bramce", "obronił rzut karny",
+                   "dostał czerwoną kartkę", "zdobył bramkę głową po rzucie rożnym"],
+        "competition": ["Ekstraklasy", "Ligi Mistrzów", "Ligi Konferencji", "Pucharu Polski"],
+    },
+    "tenis": {
+        "name": "tenisie",
+        "teams": ["Polska", "Hiszpania", "Włochy", "USA"],
+        "players": ["Iga Świątek", "Hubert Hurkacz", "Magda Linette", "Magdalena Fręch", "Kamil Majchrzak"],
+        "events": ["wygrała pierwszego seta {score}", "obroniła trzy break pointy", "zaserwowała {minute} asów",
+                   "przegrała tie-breaka", "awansowała do kolejnej rundy"],
+        "competition": ["Roland Garros", "Wimbledonu", "US Open", "turnieju WTA 1000"],
+    },
+    "siatkowka": {
+        "name": "siatkówce",
+        "teams": ["Jastrzębski Węgiel", "ZAKSA Kędzierzyn-Koźle", "Projekt Warszawa", "Asseco Resovia"],
+        "players": ["Wilfredo Leon", "Bartosz Kurek", "Kamil Semeniuk", "Marcin Janusz", "Tomasz Fornal"],
+        "events": ["zdobył {minute} punktów", "popisał się asem serwisowym", "skutecznie blokował",
+                   "wygrał seta {score}", "został MVP spotkania"],
+        "competition": ["PlusLigi", "Ligi Narodów", "Ligi Mistrzów CEV"],
+    },
+    "lekkoatletyka": {
+        "name": "lekkoatletyce",
+        "teams": ["AZS AWF Warszawa", "Podlasie Białystok"],
+        "players": ["Natalia Kaczmarek", "Wojciech Nowicki", "Ewa Swoboda", "Pia Skrzyszowska", "Piotr Lisek"],
+        "events": ["pobiła rekord życiowy", "zajęła {minute}. miejsce", "wygrała bieg z czasem 49,{minute}",
+                   "rzuciła młotem na odległość 8{minute} metrów", "skoczyła o tyczce 5,{minute} m"],
+        "competition": ["Diamentowej Ligi", "mistrzostw Europy", "mistrzostw świata"],
+    },
+    "koszykowka": {
+        "name": "koszykówce",
+        "teams": ["Śląsk Wrocław", "Trefl Sopot", "Anwil Włocławek", "Los Angeles Lakers", "Boston Celtics"],
+        "players": ["Jeremy Sochan", "Mateusz Ponitka", "Aleksander Balcerowski", "Michał Sokołowski"],
+        "events": ["rzucił {minute} punktów", "zanotował triple-double", "trafił za trzy równo z syreną",
+                   "miał {minute} zbiórek", "wrócił po kontuzji"],
+        "competition": ["Orlen Basket Ligi", "NBA", "Euroligi"],
+    },
+    "pilka-reczna": {
+        "name": "piłce ręcznej",
+        "teams": ["Industria Kielce", "Orlen Wisła Płock", "Górnik Zabrze", "Azoty Puławy"],
+        "players": ["Kamil Syprzak", "Arkadiusz Moryto", "Szymon Sićko", "Andrzej Widomski"],
+        "events": ["rzucił {minute} bramek", "obronił rzut karny", "został wykluczony na dwie minuty",
+                   "zdobył zwycięską bramkę", "był najlepszym strzelcem"],
+        "competition": ["Superligi", "Ligi Mistrzów EHF", "mistrzostw Europy"],
+    },
+}
+
+FILLER = [
+    "Trener po meczu podkreślił, że zespół zagrał bardzo dojrzale i konsekwentnie realizował plan.",
+    "Kibice zgromadzeni na trybunach przez całe spotkanie głośno dopingowali swoich ulubieńców.",
+    "Eksperci zwracają uwagę, że forma zawodników rośnie z tygodnia na tydzień.",
+    "Kolejne spotkanie zaplanowano na przyszły weekend, a stawka będzie jeszcze wyższa.",
+    "W przerwie doszło do kilku zmian taktycznych, które odmieniły obraz gry.",
+]
+
+
+def _score(rng):
+    return f"{rng.randint(0, 6)}:{rng.randint(0, 6)}"
+
+
+def generate_articles(count, seed=42, paragraphs=6, days=7):
+    """
+    Generates `count` synthetic Polish sports articles shaped like the
+    scraped ones (title, text, url, sport, scraped_at, published_at),
+    spread over the last `days` days. The same seed gives the same corpus.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    slugs = list(SPORTS)
+    articles = []
+    for index in range(count):
+        slug = slugs[index % len(slugs)]
+        sport = SPORTS[slug]
+        home, away = rng.sample(sport["teams"], 2)
+        player = rng.choice(sport["players"])
+        competition = rng.choice(sport["competition"])
+        title = f"{home} - {away} {_score(rng)}. {player} w roli głównej w meczu {competition}"
+        body = []
+        for _ in range(paragraphs):
+            event = rng.choice(sport["events"]).format(minute=rng.randint(1, 90), score=_score(rng))
+            body.append(f"{rng.choice(sport['players'])} {event} w spotkaniu {home} z {away} w ramach {competition}. "
+                        + " ".join(rng.sample(FILLER, 2)))
+        scraped_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        articles.append({
+            "title": title,
+            "text": "\n".join(body),
+            "url": f"https://sport.example/{slug}/{index}",
+            "sport": slug,
+            "scraped_at": scraped_at,
+            "published_at": scraped_at - timedelta(minutes=rng.randint(1, 120)),
+        })
+    return articles
+
+
+def generate_queries(count, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    slugs = list(SPORTS)
+    for index in range(count):
+        sport = SPORTS[slugs[index % len(slugs)]]
+        kind = index % 3
+        if kind == 0:
+            queries.append(f"Co nowego w {sport['name']}?")
+        elif kind == 1:
+            queries.append(f"Jak zagrał {rng.choice(sport['players'])}?")
+        else:
+            home, away = rng.sample(sport["teams"], 2)
+            queries.append(f"Jaki był wynik meczu {home} z {away}?")
+    return queries
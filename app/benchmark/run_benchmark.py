@@ -0,0 +1,250 @@
+"""
+Offline performance benchmark of the RAG stack.
+
+Generates synthetic Polish sports articles, ingests them with
+process_articles/embed_and_store and queries the backend retriever and
+QA pipeline, using deterministic fake embeddings and a fake LLM so no network
+access or API key is needed. Reports ingestion throughput, retrieval and
+end-to-end latency percentiles and peak memory for each corpus size
+(each size runs in its own process, so the peak is that size's alone),
+recall@k and latency of dense search in Chroma and in the memory-mapped
+vector index (rag.vector_index) per quantization, and can compare the results against a stored baseline.
+Chunking needs tiktoken's cl100k_base encoding; offline, set TIKTOKEN_CACHE_DIR to a directory it was cached in:
+
+    python -m benchmark.run_benchmark --sizes 100 1000 --save-baseline benchmark/baseline.json
+    python -m benchmark.run_benchmark --sizes 100 1000 --baseline benchmark/baseline.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+from backend.qa import build_retriever, answer_question
+from benchmark.corpus import generate_articles, generate_queries
+from rag.chunking import get_encoding
+from rag.embed_and_store import process_articles, embed_and_store
+from rag.vector_index import DTYPES, VectorIndex, export_vector_index
+
+# Metrics where a larger value is an improvement; all others are "lower is better"
+HIGHER_IS_BETTER = {"articles_per_s", "chunks_per_s", "recall"}
+
+
+class UnitFakeEmbedding(DeterministicFakeEmbedding):
+    """Fake embeddings of unit length, like OpenAI's, so L2 (Chroma) and cosine (vector index) rank alike."""
+
+    def _get_embedding(self, seed):
+        vector = np.asarray(super()._get_embedding(seed))
+        return list(vector / np.linalg.norm(vector))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(timings_ms):
+    return {
+        "p50_ms": round(percentile(timings_ms, 50), 3),
+        "p95_ms": round(percentile(timings_ms, 95), 3),
+        "p99_ms": round(percentile(timings_ms, 99), 3),
+    }
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def directory_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / (1024 * 1024), 2)
+
+
+def benchmark_size(size, queries, dim, workdir):
+    # Keep the ingestion code's per-batch INFO logs out of the report
+    logging.getLogger().setLevel(logging.WARNING)
+    persist_directory = os.path.join(workdir, f"chroma-{size}")
+    embeddings = UnitFakeEmbedding(size=dim)
+    vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory,
+                         collection_name=f"bench_{size}")
+    articles = generate_articles(size)
+
+    started = time.perf_counter()
+    docs = process_articles(articles)
+    stats = embed_and_store(docs, persist_directory, vectorstore=vectorstore)
+    ingest_seconds = time.perf_counter() - started
+
+    retriever = build_retriever(vectorstore, persist_directory)
+    llm = FakeListChatModel(responses=["To jest odpowiedź testowa na podstawie kontekstu."])
+
+    # Warm-up so index loading is not attributed to the first query
+    retriever.invoke(queries[0])
+
+    retrieval_ms = []
+    for query in queries:
+        started = time.perf_counter()
+        retriever.invoke(query)
+        retrieval_ms.append((time.perf_counter() - started) * 1000)
+
+    end_to_end_ms = []
+    for query in queries:
+        started = time.perf_counter()
+        answer_question(llm, retriever, query)
+        end_to_end_ms.append((time.perf_counter() - started) * 1000)
+
+    # Measured before the vector index exports, which go to their own directory
+    store_mb = directory_mb(persist_directory)
+    vector_search = benchmark_vector_search(vectorstore, embeddings.embed_documents(queries),
+                                            os.path.join(workdir, f"index-{size}"))
+
+    return {
+        "articles": size,
+        "chunks": stats["chunks"],
+        "ingest_s": round(ingest_seconds, 3),
+        "articles_per_s": round(size / ingest_seconds, 1),
+        "chunks_per_s": round(stats["chunks"] / ingest_seconds, 1),
+        "retrieval": latency_summary(retrieval_ms),
+        "end_to_end": latency_summary(end_to_end_ms),
+        "store_mb": store_mb,
+        "max_rss_mb": max_rss_mb(),
+        "vector_search": vector_search,
+    }
+
+
+def benchmark_size_in_process(size, queries, dim, workdir):
+    # A fresh process per size, so max_rss_mb is that size's own peak rather than the largest so far
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(benchmark_size, (size, queries, dim, workdir))
+
+
+def benchmark_vector_search(vectorstore, query_vectors, export_directory, k=20):
+    """
+    Recall@k and per-query latency of unfiltered dense search in Chroma and
+    in the exported vector index for each dtype (written under
+    export_directory), against exact float32 cosine search over all stored
+    vectors.
+    """
+    collection = vectorstore._collection
+    stored = collection.get(include=["embeddings"])
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    exact = [set(np.asarray(stored["ids"])[np.argsort(-scores)[:k]]) for scores in queries @ matrix.T]
+
+    def measure(search):
+        timings_ms, found = [], []
+        for vector in query_vectors:
+            started = time.perf_counter()
+            found.append(search(vector))
+            timings_ms.append((time.perf_counter() - started) * 1000)
+        recall = sum(len(ids & truth) for ids, truth in zip(found, exact)) / sum(len(truth) for truth in exact)
+        return dict(latency_summary(timings_ms), recall=round(recall, 4))
+
+    results = {"chroma": measure(
+        lambda vector: set(collection.query(query_embeddings=[vector], n_results=k, include=[])["ids"][0])
+    )}
+    for dtype in DTYPES:
+        index_directory = os.path.join(export_directory, dtype)
+        os.makedirs(index_directory)
+        export_vector_index(index_directory, collection, dtype)
+        index = VectorIndex.open(index_directory)
+        results[dtype] = measure(
+            lambda vector: {index.get_document(row).id for row, _ in index.search([vector], k)[0]}
+        )
+        results[dtype]["index_mb"] = directory_mb(index_directory)
+    return results
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Returns (lines, regressions) comparing flattened metrics with the baseline."""
+    current = _flatten(results["results"])
+    previous = _flatten(baseline["results"])
+    lines, regressions = [], []
+    for name in sorted(current):
+        if name not in previous or not previous[name]:
+            continue
+        change = (current[name] - previous[name]) / previous[name]
+        metric = name.rsplit(".", 1)[-1]
+        if metric in ("articles", "chunks"):
+            continue
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        lines.append(f"{name:40} {previous[name]:>12} -> {current[name]:>12} ({change:+.1%}) {flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of ingestion, retrieval and QA latency.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Corpus sizes (articles)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="Fake embedding dimension")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previously saved results file")
+    parser.add_argument("--save-baseline", help="Save results as the new baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    try:
+        get_encoding()
+    except RuntimeError as e:
+        sys.exit(str(e))
+    queries = generate_queries(args.queries)
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        results = {
+            "config": {"queries": args.queries, "dim": args.dim, "python": platform.python_version()},
+            "results": {str(size): benchmark_size_in_process(size, queries, args.dim, workdir)
+                        for size in args.sizes},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.tolerance)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,16 @@ if [ "$SERVICE" = "scraper" ]; then
   echo "[`date`] Initial scrape"
   python /app/scrapper/scrap_sports.py || echo "Pierwszy scraping zakończony błędem"
 elif [ "$SERVICE" = "rag" ]; then
-  echo "[`date`] Initial RAG update"
-  python /app/run_rag_update.py || echo "Pierwszy run_rag_update błędny"
+  # Long-lived consumer: catches up on startup, then embeds articles as the scraper stores them
+  echo "[`date`] Starting RAG updater (follow mode)"
+  exec python /app/run_rag_update.py --follow
 elif [ "$SERVICE" = "backend" ]; then
-  echo "[`date`] Starting Flask backend"
-  python /app/backend/app.py
-  exit 0
+  echo "[`date`] Starting Flask backend (gunicorn)"
+  if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    # Metric files of a previous run would be merged into the new counters
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+  fi
+  exec gunicorn -c /app/backend/gunicorn.conf.py backend.app:app
   elif [ "$SERVICE" = "frontend" ]; then
     streamlit run frontend/streamlit_app.py --server.port=8501 --server.address=0.0.0.0
   else
@@ -26,9 +30,6 @@ while true; do
   if [ "$SERVICE" = "scraper" ]; then
     echo "[`date`] Running scraper..."
     python /app/scrapper/scrap_sports.py || echo "Scraper error"
-  elif [ "$SERVICE" = "rag" ]; then
-    echo "[`date`] Running RAG update..."
-    python /app/run_rag_update.py || echo "RAG update error"
   fi
   sleep 120
 done
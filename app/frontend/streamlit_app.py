@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import json
 import os
+import itertools
+import uuid
 
 
 FLASK_BACKEND_URL = os.getenv("FLASK_BACKEND_URL", "http://0.0.0.0:5000") 
@@ -16,6 +18,10 @@ st.write("Hej! Jestem tu żeby ułatwić ci dostęp do nowinek z świata sportu.
 if "messages" not in st.session_state:
     st.session_state.messages = []
     
+if "session_id" not in st.session_state:
+    # Lets the backend keep the conversation history, so follow-up questions are understood
+    st.session_state.session_id = uuid.uuid4().hex
+
 if "chat_placeholders" not in st.session_state:
     st.session_state.chat_placeholders = []
 
@@ -34,26 +40,35 @@ if query:
         st.markdown(query)
 
     with st.chat_message("assistant"):
-        with st.spinner("Myślę... Proszę czekać..."):
-            try:
-                response = requests.post(f"{FLASK_BACKEND_URL}/query", json={"query": query})
-                response.raise_for_status() 
-
-                result = response.json()
-                answer = result.get("answer", "Nie udało mi się znaleźć odpowiedzi.")
-                st.markdown(answer)
-                st.session_state.messages.append({"role": "assistant", "content": answer})
-
-            except requests.exceptions.ConnectionError:
-                st.error("Błąd połączenia z backendem. Upewnij się, że serwer Flask działa.")
-                st.session_state.messages.append({"role": "assistant", "content": "Błąd połączenia z backendem."})
-            except requests.exceptions.RequestException as e:
-                st.error(f"Wystąpił błąd podczas komunikacji z backendem: {e}")
-                st.session_state.messages.append({"role": "assistant", "content": f"Błąd komunikacji: {e}"})
-            except json.JSONDecodeError:
-                st.error("Backend zwrócił nieprawidłową odpowiedź JSON.")
-                st.session_state.messages.append({"role": "assistant", "content": "Błąd: nieprawidłowa odpowiedź JSON."})
-            except Exception as e:
-                st.error(f"Wystąpił nieoczekiwany błąd: {e}")
-                st.session_state.messages.append({"role": "assistant", "content": f"Nieoczekiwany błąd: {e}"})
-
+        try:
+            with st.spinner("Myślę... Proszę czekać..."):
+                payload = {"query": query, "session_id": st.session_state.session_id}
+                response = requests.post(f"{FLASK_BACKEND_URL}/query/stream", json=payload, stream=True)
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                events = (json.loads(line) for line in response.iter_lines(decode_unicode=True) if line)
+                # Wait for the sources event so the spinner covers retrieval only
+                first_event = next(events, None)
+
+            def answer_tokens():
+                for event in itertools.chain([first_event] if first_event else [], events):
+                    if event["type"] == "token":
+                        yield event["token"]
+                    elif event["type"] == "error":
+                        raise RuntimeError(event["error"])
+
+            answer = st.write_stream(answer_tokens()) or "Nie udało mi się znaleźć odpowiedzi."
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+
+        except requests.exceptions.ConnectionError:
+            st.error("Błąd połączenia z backendem. Upewnij się, że serwer Flask działa.")
+            st.session_state.messages.append({"role": "assistant", "content": "Błąd połączenia z backendem."})
+        except requests.exceptions.RequestException as e:
+            st.error(f"Wystąpił błąd podczas komunikacji z backendem: {e}")
+            st.session_state.messages.append({"role": "assistant", "content": f"Błąd komunikacji: {e}"})
+        except json.JSONDecodeError:
+            st.error("Backend zwrócił nieprawidłową odpowiedź JSON.")
+            st.session_state.messages.append({"role": "assistant", "content": "Błąd: nieprawidłowa odpowiedź JSON."})
+        except Exception as e:
+            st.error(f"Wystąpił nieoczekiwany błąd: {e}")
+            st.session_state.messages.append({"role": "assistant", "content": f"Nieoczekiwany błąd: {e}"})
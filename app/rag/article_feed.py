@@ -0,0 +1,142 @@
+import logging
+import time
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Capped collection the scraper appends one event to per flush of newly inserted articles
+EVENT_LOG_COLLECTION = "article_events"
+EVENT_LOG_SIZE_BYTES = 16 * 1024 * 1024
+# Fields of an article the updater needs; everything else stays on the server
+ARTICLE_FIELDS = ["title", "text", "url", "date", "sport", "scraped_at", "published_at"]
+ARTICLE_PROJECTION = dict.fromkeys(ARTICLE_FIELDS, 1)
+
+CHANGE_STREAM_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def ensure_event_log(db):
+    try:
+        db.create_collection(EVENT_LOG_COLLECTION, capped=True, size=EVENT_LOG_SIZE_BYTES)
+    except CollectionInvalid:
+        pass
+    return db[EVENT_LOG_COLLECTION]
+
+
+class _Feed:
+    """
+    Pull-based source of newly inserted articles. `position` is what to
+    persist to resume after a restart; it only covers articles returned
+    by `poll`, so saving it after they are stored never skips any.
+    """
+
+    state_key = None
+    position = None
+
+    def _next_articles(self):
+        raise NotImplementedError
+
+    def poll(self, max_items, max_wait):
+        """
+        Returns up to `max_items` new articles, waiting at most `max_wait`
+        seconds. An idle feed blocks in MongoDB's await, so no work is done
+        while nothing is scraped.
+        """
+        articles = []
+        deadline = time.monotonic() + max_wait
+        while len(articles) < max_items and time.monotonic() < deadline:
+            articles.extend(self._next_articles())
+        return articles
+
+    def close(self):
+        pass
+
+
+class ChangeStreamFeed(_Feed):
+    """Follows inserts into the articles collection; needs a replica set."""
+
+    state_key = "change_stream_token"
+
+    def __init__(self, collection, resume_token=None, await_ms=500):
+        project = {"_id": 1, "operationType": 1}
+        project.update({f"fullDocument.{field}": 1 for field in ARTICLE_FIELDS})
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "replace"]}}}, {"$project": project}]
+        try:
+            self._stream = collection.watch(pipeline, resume_after=resume_token, max_await_time_ms=await_ms)
+        except OperationFailure as e:
+            if resume_token is None or e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            logger.warning("Resume token is no longer in the oplog, following from now; "
+                           "the startup catch-up covers the gap")
+            self._stream = collection.watch(pipeline, max_await_time_ms=await_ms)
+        self.position = resume_token
+
+    def _next_articles(self):
+        change = self._stream.try_next()
+        self.position = self._stream.resume_token
+        return [change["fullDocument"]] if change and change.get("fullDocument") else []
+
+    def close(self):
+        self._stream.close()
+
+
+class EventLogFeed(_Feed):
+    """
+    Tails the capped event log written by the scraper's ArticleWriter and
+    loads the articles each event names. Works on a standalone mongod.
+    """
+
+    state_key = "event_log_position"
+
+    def __init__(self, events, articles, position=None, await_ms=500):
+        self.events = events
+        self.articles = articles
+        self.await_ms = await_ms
+        if position is None:
+            # Nothing to resume from: follow new events only, older articles come from the catch-up load
+            last = events.find_one(sort=[("$natural", -1)])
+            position = str(last["_id"]) if last else None
+        self.position = position
+        self._cursor = None
+
+    def _open_cursor(self):
+        query = {"_id": {"$gt": ObjectId(self.position)}} if self.position else {}
+        return self.events.find(query, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(self.await_ms)
+
+    def _next_articles(self):
+        if self._cursor is None:
+            self._cursor = self._open_cursor()
+        try:
+            event = next(self._cursor)
+        except StopIteration:
+            if not self._cursor.alive:
+                # A tailable cursor over an empty log dies at once; don't spin on re-opening it
+                self._cursor = None
+                time.sleep(self.await_ms / 1000)
+            return []
+        self.position = str(event["_id"])
+        ids = event.get("article_ids") or []
+        return list(self.articles.find({"_id": {"$in": ids}}, ARTICLE_PROJECTION)) if ids else []
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+
+
+def open_feed(db, articles, state, kind="auto"):
+    """
+    Opens the article feed named by `kind`: "change_stream", "event_log",
+    or "auto" to use a change stream when MongoDB supports it and the
+    event log otherwise. Resumes from the position stored in `state`.
+    """
+    if kind in ("auto", "change_stream"):
+        try:
+            return ChangeStreamFeed(articles, state.get(ChangeStreamFeed.state_key))
+        except OperationFailure as e:
+            if kind == "change_stream" or e.code != CHANGE_STREAM_UNSUPPORTED:
+                raise
+            logger.info("MongoDB is not a replica set, following the article event log instead")
+    return EventLogFeed(ensure_event_log(db), articles, state.get(EventLogFeed.state_key))
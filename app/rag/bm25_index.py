@@ -0,0 +1,340 @@
+import heapq
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from rag.ingest_state import read_generation
+from rag.sports import UNTAGGED
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "bm25_index.pkl"
+DELTA_FILENAME = "bm25_delta.jsonl"
+# The delta is folded into a new base pickle once it grows past this size
+DELTA_COMPACT_BYTES = 32 * 1024 * 1024
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Crude stemming for Polish inflection: "Lewandowskiego" and "Lewandowski" share a prefix
+STEM_LENGTH = 6
+STOPWORDS = {
+    "a", "i", "o", "u", "w", "z", "na", "do", "od", "po", "za", "ze", "we", "sie", "nie", "to", "ten", "ta",
+    "jest", "jak", "co", "czy", "ale", "oraz", "dla", "przy", "przez", "juz", "tak", "jego", "jej", "ich",
+    "ktory", "ktora", "ktore", "bylo", "byl", "byla", "tez", "tylko", "mnie", "mi", "sa"
+}
+
+
+def _fold(text):
+    text = text.casefold().replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN.findall(_fold(text)):
+        if token in STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        tokens.append(token if token.isdigit() else token[:STEM_LENGTH])
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring over article chunks.
+    Chunks are keyed by their vectorstore ID so results can be fused with
+    dense search, and stored with their text and metadata so a hit can be
+    returned as a Document without touching Chroma.
+
+    On disk the index is a base pickle plus an append-only delta of the
+    changes made since (see update_lexical_index); `base_id` ties a delta
+    to the base it applies to. Changes and searches take an internal lock,
+    so a reader can apply new delta entries while serving queries.
+    Chunk IDs are also kept per sport, so a search restricted to some
+    sports only scores their chunks and the untagged ones.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self.documents = {}
+        self.total_length = 0
+        self.sport_ids = {UNTAGGED: set()}
+        self.base_id = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault("base_id", None)
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        # Indexes pickled before untagged chunks were tracked are regrouped on load
+        if UNTAGGED not in state.get("sport_ids", {}):
+            self.sport_ids = {UNTAGGED: set()}
+            for doc_id, (_, metadata) in self.documents.items():
+                self._add_sport(doc_id, metadata)
+
+    def _add_sport(self, doc_id, metadata):
+        self.sport_ids.setdefault(metadata.get("sport") or UNTAGGED, set()).add(doc_id)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def apply(self, changes):
+        """Applies delta entries ({"op": "add"/"remove", ...}) in order."""
+        with self._lock:
+            for change in changes:
+                if change["op"] == "add":
+                    self.add(change["id"], change["text"], change["metadata"])
+                else:
+                    self.remove(change["id"])
+
+    def add(self, doc_id, text, metadata):
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self.remove(doc_id)
+            terms = Counter(tokenize(metadata.get("title") or "") + tokenize(text))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self.documents[doc_id] = (text, metadata)
+            self._add_sport(doc_id, metadata)
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id not in self.doc_lengths:
+                return
+            text, metadata = self.documents.pop(doc_id)
+            for term in set(tokenize(metadata.get("title") or "") + tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            sport_ids = self.sport_ids.get(metadata.get("sport") or UNTAGGED)
+            if sport_ids is not None:
+                sport_ids.discard(doc_id)
+
+    def search(self, query, k, filter_fn=None, sports=None):
+        """
+        Returns up to k (doc_id, score) pairs, best first. Only chunks of
+        `sports` (when given) that pass `filter_fn(metadata)` are scored;
+        the filter runs once per candidate chunk, before scoring.
+        """
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            count = len(self.doc_lengths)
+            average_length = self.total_length / count
+            candidates = None
+            if sports:
+                candidates = set().union(*(self.sport_ids.get(sport, ()) for sport in list(sports) + [UNTAGGED]))
+            allowed = {}
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if candidates is not None and len(candidates) < len(postings):
+                    matches = ((doc_id, postings[doc_id]) for doc_id in candidates if doc_id in postings)
+                else:
+                    matches = ((doc_id, frequency) for doc_id, frequency in postings.items()
+                               if candidates is None or doc_id in candidates)
+                for doc_id, frequency in matches:
+                    if filter_fn is not None:
+                        if doc_id not in allowed:
+                            allowed[doc_id] = filter_fn(self.documents[doc_id][1])
+                        if not allowed[doc_id]:
+                            continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get_document(self, doc_id):
+        with self._lock:
+            text, metadata = self.documents[doc_id]
+        return Document(id=doc_id, page_content=text, metadata=metadata)
+
+    def save(self, persist_directory):
+        """Writes the index as a new base with an empty delta."""
+        os.makedirs(persist_directory, exist_ok=True)
+        self.base_id = str(time.time_ns())
+        fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".bm25_index.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with self._lock:
+                    pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(persist_directory, INDEX_FILENAME))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _reset_delta(persist_directory, self.base_id)
+
+    @classmethod
+    def load(cls, persist_directory):
+        """Loads the base and applies its delta; returns None when there is no index yet."""
+        return load_lexical_index(persist_directory)[0]
+
+    @classmethod
+    def load_base(cls, persist_directory):
+        path = os.path.join(persist_directory, INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def load_lexical_index(persist_directory):
+    """Returns the stored index with its delta applied and the delta offset it reflects, or (None, 0)."""
+    for _ in range(3):
+        index = BM25Index.load_base(persist_directory)
+        if index is None:
+            return None, 0
+        base_id, changes, offset = read_delta(persist_directory)
+        # Otherwise a compaction ran between reading the base and the delta: read both again
+        if base_id == index.base_id or base_id is None:
+            index.apply(changes)
+            return index, offset
+    raise RuntimeError("BM25 index kept changing while it was loaded")
+
+
+def _delta_path(persist_directory):
+    return os.path.join(persist_directory, DELTA_FILENAME)
+
+
+def _reset_delta(persist_directory, base_id):
+    fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".bm25_delta.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"base_id": base_id}) + "\n")
+        os.replace(tmp_path, _delta_path(persist_directory))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_delta(persist_directory, offset=0):
+    """
+    Returns (base_id, changes, end offset) for the complete delta lines
+    after `offset`; a line still being appended is left for the next read.
+    base_id is None when there is no delta file.
+    """
+    try:
+        with open(_delta_path(persist_directory), "rb") as f:
+            header = json.loads(f.readline())
+            f.seek(max(offset, f.tell()))
+            start = f.tell()
+            data = f.read()
+    except FileNotFoundError:
+        return None, [], offset
+    complete = data[:data.rfind(b"\n") + 1]
+    changes = [json.loads(line) for line in complete.splitlines() if line.strip()]
+    return header["base_id"], changes, start + len(complete)
+
+
+def append_delta(persist_directory, added_docs=(), added_ids=(), removed_ids=()):
+    """Appends changes to the delta of the stored index. Returns False when there is no index yet."""
+    # A base written before the delta existed gets an empty one first
+    if not os.path.exists(_delta_path(persist_directory)) and compact_lexical_index(persist_directory) is None:
+        return False
+    lines = [json.dumps({"op": "add", "id": doc_id, "text": doc.page_content, "metadata": doc.metadata},
+                        ensure_ascii=False) for doc, doc_id in zip(added_docs, added_ids)]
+    lines += [json.dumps({"op": "remove", "id": doc_id}) for doc_id in removed_ids]
+    if lines:
+        with open(_delta_path(persist_directory), "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    return True
+
+
+def compact_lexical_index(persist_directory):
+    """Folds the delta into a new base pickle."""
+    started = time.perf_counter()
+    index = BM25Index.load(persist_directory)
+    if index is not None:
+        index.save(persist_directory)
+        logger.info(f"Compacted BM25 index of {len(index)} chunks in {time.perf_counter() - started:.1f} s")
+    return index
+
+
+def update_lexical_index(persist_directory, vectorstore, added_docs, added_ids, removed_ids):
+    """
+    Applies one ingestion run to the persisted BM25 index by appending it to
+    the delta, so the cost follows the batch rather than the corpus; the
+    delta is compacted into a new base once it exceeds DELTA_COMPACT_BYTES.
+    When no index exists yet it is bootstrapped from everything already in
+    the collection.
+    """
+    if append_delta(persist_directory, added_docs, added_ids, removed_ids):
+        if os.path.getsize(_delta_path(persist_directory)) > DELTA_COMPACT_BYTES:
+            compact_lexical_index(persist_directory)
+        return
+    index = BM25Index()
+    existing = vectorstore.get(include=["documents", "metadatas"])
+    for doc_id, text, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+        index.add(doc_id, text, metadata or {})
+    index.save(persist_directory)
+    logger.info(f"Bootstrapped BM25 index from {len(index)} stored chunks")
+
+
+class ReloadingBM25Index:
+    """
+    Read side for the backend: loads the persisted index on first use and,
+    whenever the updater bumps the vectorstore generation, catches up in a
+    background thread so no request waits for it. New delta entries are
+    applied to the loaded index in place; after a compaction (a new base)
+    the whole index is loaded aside and the reference swapped.
+    """
+
+    def __init__(self, persist_directory):
+        self.persist_directory = persist_directory
+        self._index = None
+        self._offset = 0
+        self._generation = None
+        self._refreshing = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, generation):
+        try:
+            index = self._index
+            base_id, changes, offset = read_delta(self.persist_directory, self._offset) \
+                if index is not None else (None, [], 0)
+            if index is not None and base_id is not None and base_id == index.base_id:
+                index.apply(changes)
+                self._offset = offset
+            else:
+                self._index, self._offset = load_lexical_index(self.persist_directory)
+        except Exception as e:
+            logger.error(f"Could not load BM25 index: {e}")
+        self._generation = generation
+
+    def get(self):
+        generation = read_generation(self.persist_directory)
+        if generation != self._generation:
+            with self._lock:
+                if self._generation is None:
+                    self._refresh(generation)
+                elif generation != self._generation and not (self._refreshing and self._refreshing.is_alive()):
+                    self._refreshing = threading.Thread(target=self._refresh, args=(generation,),
+                                                        name="bm25-refresh", daemon=True)
+                    self._refreshing.start()
+        return self._index
@@ -0,0 +1,89 @@
+import re
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+ENCODING_NAME = "cl100k_base"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    # tiktoken downloads the encoding on first use and keeps it in TIKTOKEN_CACHE_DIR (the Docker image ships it)
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        raise RuntimeError(
+            f"Nie udało się wczytać kodowania tiktoken {ENCODING_NAME}: {e}. Bez dostępu do sieci ustaw "
+            f"TIKTOKEN_CACHE_DIR na katalog, w którym zostało wcześniej pobrane (zob. README)."
+        ) from e
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def split_sentences(text: str) -> List[str]:
+    """Paragraphs of the text split into sentences, without empty entries."""
+    return [sentence.strip() for paragraph in text.split("\n")
+            for sentence in _SENTENCE_END.split(paragraph) if sentence.strip()]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = get_encoding().encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else get_encoding().decode(tokens[:max_tokens])
+
+
+def _split_units(text: str, chunk_size: int) -> List[str]:
+    """
+    Breaks text into paragraphs, paragraphs that are too long into sentences,
+    and sentences that are still too long into raw token windows.
+    """
+    units = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= chunk_size:
+            units.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            tokens = get_encoding().encode(sentence, disallowed_special=())
+            if len(tokens) <= chunk_size:
+                units.append(sentence)
+                continue
+            for start in range(0, len(tokens), chunk_size):
+                units.append(get_encoding().decode(tokens[start:start + chunk_size]))
+    return units
+
+
+def split_into_chunks(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Packs paragraphs/sentences greedily into chunks of at most `chunk_size`
+    tokens. Each new chunk starts with trailing units of the previous one,
+    up to `chunk_overlap` tokens, so context is not lost at the boundaries.
+    """
+    chunks = []
+    current, current_tokens = [], []
+    for unit in _split_units(text, chunk_size):
+        unit_tokens = count_tokens(unit)
+        if current and sum(current_tokens) + unit_tokens > chunk_size:
+            chunks.append("\n".join(current))
+            overlap, overlap_tokens = [], []
+            for previous, previous_tokens in zip(reversed(current), reversed(current_tokens)):
+                if sum(overlap_tokens) + previous_tokens > chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+                overlap_tokens.insert(0, previous_tokens)
+            # Never carry over so much that the new unit does not fit
+            while overlap and sum(overlap_tokens) + unit_tokens > chunk_size:
+                overlap.pop(0)
+                overlap_tokens.pop(0)
+            current, current_tokens = overlap, overlap_tokens
+        current.append(unit)
+        current_tokens.append(unit_tokens)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
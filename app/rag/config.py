@@ -1,16 +1,104 @@
 import os
 from dotenv import load_dotenv
-from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
+from rag.embedding_cache import CachedEmbeddings
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", "data/vectorstore/chroma")
+# Embedding backend shared by the updater and the backend: "openai" or "local" (sentence-transformers on CPU).
+# Switching it requires re-indexing; both services refuse a store built with other embeddings.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+# "torch" or "onnx" (needs sentence-transformers[onnx])
+LOCAL_EMBEDDING_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+# Articles scraped slightly before the stored watermark are re-read on every run,
+# so inserts that land out of order are still picked up (re-reads are skipped by ID).
+INGEST_OVERLAP_SECONDS = int(os.getenv("INGEST_OVERLAP_SECONDS", "300"))
+# Shared by the updater and the backend; set to an empty string to disable caching
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Articles are split into chunks of at most this many tokens before embedding
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# Embedding requests are batched by token budget and sent concurrently
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_MAX_DOCS = int(os.getenv("EMBED_BATCH_MAX_DOCS", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Articles read from MongoDB per cursor round trip and per embed_and_store call when catching up
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# run_rag_update.py --follow: article source (auto | change_stream | event_log) and micro-batch limits.
+# A batch is stored once it has FOLLOW_BATCH_SIZE articles or FOLLOW_MAX_WAIT_SECONDS have passed.
+ARTICLE_FEED = os.getenv("ARTICLE_FEED", "auto")
+FOLLOW_BATCH_SIZE = int(os.getenv("FOLLOW_BATCH_SIZE", "64"))
+FOLLOW_MAX_WAIT_SECONDS = float(os.getenv("FOLLOW_MAX_WAIT_SECONDS", "2"))
+# --follow also re-reads articles scraped since the watermark this often, so an article whose feed event was lost
+# is still stored; keep it below INGEST_OVERLAP_SECONDS. A batch that fails to store is retried after the delay.
+FOLLOW_CATCH_UP_INTERVAL_SECONDS = float(os.getenv("FOLLOW_CATCH_UP_INTERVAL_SECONDS", "120"))
+FOLLOW_RETRY_SECONDS = float(os.getenv("FOLLOW_RETRY_SECONDS", "10"))
+# Memory-mapped copy of the vectors exported for the backend (float32 | float16 | int8, empty = not exported).
+# In --follow mode it is re-exported at most once per VECTOR_INDEX_EXPORT_INTERVAL_SECONDS. Each export rewrites
+# the whole collection, and until it lands new chunks are found by BM25 but not by dense search, so this interval
+# (plus the export time) bounds how long the dense side lags behind.
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_INDEX_EXPORT_INTERVAL_SECONDS = float(os.getenv("VECTOR_INDEX_EXPORT_INTERVAL_SECONDS", "60"))
+# Per-sport "what's new" answers regenerated with the vector index from the freshest articles
+# (at most DIGEST_ARTICLES scraped in the last DIGEST_MAX_AGE_HOURS) and served by the backend
+DIGESTS = os.getenv("DIGESTS", "1") == "1"
+DIGEST_MODEL = os.getenv("DIGEST_MODEL", "gpt-4o-mini")
+DIGEST_MAX_AGE_HOURS = float(os.getenv("DIGEST_MAX_AGE_HOURS", "24"))
+DIGEST_ARTICLES = int(os.getenv("DIGEST_ARTICLES", "6"))
+
+def with_embedding_cache(embeddings):
+    if not EMBEDDING_CACHE_PATH:
+        return embeddings
+    return CachedEmbeddings(embeddings, EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
 
 def get_embeddings():
+    if EMBEDDING_BACKEND == "local":
+        from rag.local_embeddings import LocalEmbeddings
+        return with_embedding_cache(LocalEmbeddings(
+            LOCAL_EMBEDDING_MODEL,
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            workers=LOCAL_EMBEDDING_WORKERS,
+            runtime=LOCAL_EMBEDDING_RUNTIME
+        ))
+    if EMBEDDING_BACKEND != "openai":
+        raise ValueError(f"Nieznany EMBEDDING_BACKEND: {EMBEDDING_BACKEND} (dostępne: openai, local)")
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY nie ustawione")
+    from langchain_openai import OpenAIEmbeddings
+    return with_embedding_cache(OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY))
+
+# Output dimensions of the OpenAI embedding models, so startup checks need no API call
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+def embedding_signature(embeddings):
+    """Model name and vector dimension, recorded with the vectorstore to detect a backend switch."""
+    inner = getattr(embeddings, "embeddings", embeddings)
+    model = getattr(embeddings, "model_name", None) or getattr(inner, "model", None) or type(inner).__name__
+    dimension = (getattr(inner, "dimension", None) or getattr(inner, "dimensions", None)
+                 or OPENAI_EMBEDDING_DIMENSIONS.get(model) or len(embeddings.embed_query("wymiar")))
+    return {"model": model, "dimension": dimension}
+
+def collection_dimension(vectorstore):
+    """Dimension of a stored vector, or None for an empty collection."""
+    sample = vectorstore._collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    return len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+
+def get_digest_llm():
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY nie ustawione")
-    return OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(openai_api_key=OPENAI_API_KEY, temperature=0, model_name=DIGEST_MODEL)
 
-def get_vectorstore(persist_directory="data/vectorstore/chroma"):
+def get_vectorstore(persist_directory=VECTORSTORE_DIR):
     return Chroma(
         embedding_function=get_embeddings(),
         persist_directory=persist_directory
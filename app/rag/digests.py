@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+from langchain_core.prompts import PromptTemplate
+
+from rag.chunking import truncate_tokens
+from rag.sports import SPORT_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_FILENAME = "digests.json"
+
+# How each sport is named in the digest question ("Co nowego w ...?")
+SPORT_NAMES = {
+    "pilka-nozna": "piłce nożnej",
+    "tenis": "tenisie",
+    "siatkowka": "siatkówce",
+    "lekkoatletyka": "lekkoatletyce",
+    "koszykowka": "koszykówce",
+    "pilka-reczna": "piłce ręcznej",
+}
+# Word prefixes (lowercase, without diacritics) that name a sport as a whole; competitions, clubs and
+# players make a question specific, so they are deliberately not listed here
+SPORT_NAME_PREFIXES = {
+    "pilka-nozna": ["nozn", "futbol", "football", "pilkars"],
+    "tenis": ["tenis"],
+    "siatkowka": ["siatk", "volley"],
+    "lekkoatletyka": ["lekkoatlet"],
+    "koszykowka": ["koszyk", "basket"],
+    "pilka-reczna": ["reczn", "szczypiorn", "handball"],
+}
+# Words a generic "what's new" question may consist of besides the sport name
+GENERIC_WORDS = {
+    "co", "nowego", "slychac", "sie", "dzieje", "dzialo", "wydarzylo", "ostatnio", "dzis", "dzisiaj", "teraz",
+    "najnowsze", "najnowszych", "ostatnie", "ostatnich", "dniach", "wiadomosci", "wiesci", "nowinki", "nowosci",
+    "aktualnosci", "informacje", "newsy", "news", "wydarzenia", "podsumowanie", "podsumuj", "przeglad", "jakie",
+    "sa", "daj", "podaj", "powiedz", "opowiedz", "mi", "prosze", "z", "ze", "w", "we", "o", "na", "swiecie",
+    "swiata", "pilka", "pilki", "pilce", "pilke", "sport", "sportu", "sporcie",
+}
+
+digest_template_content = """Jesteś asystentem sportowym. Na podstawie poniższych najnowszych artykułów napisz krótkie podsumowanie najważniejszych wydarzeń w {sport}.
+Wymień konkretne wyniki, nazwiska i rozgrywki, zaczynając od najświeższych. Nie dodawaj informacji spoza artykułów. Odpowiedz w 3-6 zdaniach.
+
+Artykuły:
+{context}
+
+Podsumowanie:"""
+DIGEST_PROMPT = PromptTemplate(template=digest_template_content, input_variables=["sport", "context"])
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(text):
+    text = text.casefold().replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def match_digest_query(question):
+    """
+    Returns the sport of a generic "what's new in <sport>" question, or None
+    when the question names no sport, several sports, or anything beyond
+    the sport and generic words (a player, a club, a competition).
+    """
+    sports = set()
+    for word in _WORD.findall(_fold(question)):
+        matched = [sport for sport, prefixes in SPORT_NAME_PREFIXES.items() if word.startswith(tuple(prefixes))]
+        if matched:
+            sports.update(matched)
+        elif word not in GENERIC_WORDS:
+            return None
+    return sports.pop() if len(sports) == 1 else None
+
+
+def digest_question(sport):
+    return f"Co nowego w {SPORT_NAMES.get(sport, sport)}?"
+
+
+def freshest_articles(collection, sport, max_age_hours, max_articles):
+    """
+    Lead chunks of the newest articles of a sport scraped in the last
+    `max_age_hours`, newest first, at most one per article.
+    """
+    min_scraped_ts = time.time() - max_age_hours * 3600
+    result = collection.get(
+        where={"$and": [{"sport": sport}, {"scraped_ts": {"$gte": min_scraped_ts}}, {"chunk_index": 0}]},
+        include=["documents", "metadatas"]
+    )
+    articles = {}
+    for text, metadata in zip(result["documents"], result["metadatas"]):
+        articles.setdefault(metadata.get("parent_id") or metadata.get("url"), (text, metadata))
+    ranked = sorted(articles.values(),
+                    key=lambda article: article[1].get("published_ts") or article[1].get("scraped_ts") or 0,
+                    reverse=True)
+    return ranked[:max_articles]
+
+
+def build_digest(llm, sport, articles, article_tokens):
+    """Generates the digest of one sport; returns the store entry with its answer and sources."""
+    context = "\n\n".join(
+        f"{metadata.get('title') or ''}\n{truncate_tokens(text, article_tokens)}" for text, metadata in articles
+    )
+    started = time.perf_counter()
+    message = llm.invoke(DIGEST_PROMPT.format(sport=SPORT_NAMES.get(sport, sport), context=context))
+    return {
+        "answer": getattr(message, "content", message).strip(),
+        "sources": [metadata for _, metadata in articles],
+        "question": digest_question(sport),
+        "generated_at": datetime.utcnow().isoformat(),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _articles_key(articles):
+    return hashlib.sha1("\n".join(metadata.get("parent_id") or "" for _, metadata in articles)
+                        .encode("utf-8")).hexdigest()
+
+
+def refresh_digests(llm, collection, persist_directory, generation, sports=None, max_age_hours=24.0,
+                    max_articles=6, article_tokens=250):
+    """
+    Regenerates the per-sport digests from the freshest articles and
+    publishes them atomically. A sport whose freshest articles are the same
+    as in the previous run keeps its digest without an LLM call; a sport
+    with no recent articles gets none, so its questions take the regular path.
+    Each digest expires `max_age_hours` after its newest source was
+    scraped, so it is not served once its articles fall out of the window
+    even if no refresh happens in between.
+    """
+    started = time.perf_counter()
+    previous = (load_digests(persist_directory) or {}).get("digests", {})
+    digests, regenerated = {}, 0
+    for sport in sports or list(SPORT_KEYWORDS):
+        articles = freshest_articles(collection, sport, max_age_hours, max_articles)
+        if not articles:
+            continue
+        key = _articles_key(articles)
+        if previous.get(sport, {}).get("articles_key") == key:
+            digests[sport] = previous[sport]
+            continue
+        expires_at = max(metadata.get("scraped_ts") or 0 for _, metadata in articles) + max_age_hours * 3600
+        try:
+            digests[sport] = dict(build_digest(llm, sport, articles, article_tokens), articles_key=key,
+                                  expires_at=expires_at)
+            regenerated += 1
+        except Exception as e:
+            logger.error(f"Could not generate the {sport} digest: {e}")
+    store = {
+        "generation": generation,
+        "generated_at": datetime.utcnow().isoformat(),
+        "refresh_seconds": round(time.perf_counter() - started, 3),
+        "regenerated": regenerated,
+        "digests": digests,
+    }
+    save_digests(persist_directory, store)
+    logger.info(f"Refreshed {regenerated} of {len(digests)} sport digests in {store['refresh_seconds']} s")
+    return store
+
+
+def save_digests(persist_directory, store):
+    os.makedirs(persist_directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".digests.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(store, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(persist_directory, DIGESTS_FILENAME))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_digests(persist_directory):
+    path = os.path.join(persist_directory, DIGESTS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def remove_digests(persist_directory):
+    path = os.path.join(persist_directory, DIGESTS_FILENAME)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class DigestStore:
+    """
+    Read side for the backend: serves the digests written by the updater,
+    re-reading the file only when its mtime changes, and skips expired ones.
+    `hits` counts the hits of this process only (one gunicorn worker); the
+    totals across workers are in the rag_digest_hits_total metric.
+    """
+
+    def __init__(self, persist_directory):
+        self.path = os.path.join(persist_directory, DIGESTS_FILENAME)
+        self.persist_directory = persist_directory
+        self.hits = {}
+        self._store = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._store = load_digests(self.persist_directory)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not load sport digests: {e}")
+                        self._store = None
+                    self._mtime = mtime
+        return self._store
+
+    def lookup(self, question):
+        """Returns (sport, {"answer", "sources"}) for a generic question with a digest, else (None, None)."""
+        sport = match_digest_query(question)
+        store = self._current() if sport else None
+        entry = (store or {}).get("digests", {}).get(sport)
+        if not entry or entry.get("expires_at", float("inf")) < time.time():
+            return None, None
+        with self._lock:
+            self.hits[sport] = self.hits.get(sport, 0) + 1
+        return sport, {"answer": entry["answer"], "sources": entry["sources"]}
+
+    def stats(self):
+        store = self._current() or {}
+        with self._lock:
+            hits = dict(self.hits)
+        return {
+            "generation": store.get("generation"),
+            "generated_at": store.get("generated_at"),
+            "refresh_seconds": store.get("refresh_seconds"),
+            "sports": {
+                sport: {"generated_at": entry.get("generated_at"), "seconds": entry.get("seconds"),
+                        "expires_at": entry.get("expires_at"), "worker_hits": hits.get(sport, 0)}
+                for sport, entry in store.get("digests", {}).items()
+            },
+        }
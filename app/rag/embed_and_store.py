@@ -1,40 +1,175 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 from langchain.schema import Document
-from rag.config import get_vectorstore
+from rag.config import (
+    get_vectorstore, VECTORSTORE_DIR, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS,
+    EMBED_BATCH_TOKENS, EMBED_BATCH_MAX_DOCS, EMBED_CONCURRENCY
+)
+from rag.chunking import split_into_chunks, count_tokens
+from rag.bm25_index import update_lexical_index
+from rag.sports import UNTAGGED
+from datetime import timezone
 import logging
 
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 
-def process_articles(articles: List[Dict]) -> List[Document]:
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def document_id(url: str, text_hash: str) -> str:
+    # Same URL and same content always map to the same ID, so re-ingesting an
+    # unchanged article is a no-op instead of a duplicate vector.
+    return hashlib.sha256(f"{url}\n{text_hash}".encode("utf-8")).hexdigest()
+
+
+def chunk_id(parent_id: str, chunk_index: int) -> str:
+    return f"{parent_id}-{chunk_index}"
+
+
+def process_articles(articles: Iterable[Dict], chunk_size: int = CHUNK_SIZE_TOKENS,
+                     chunk_overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Document]:
     docs = []
     for article in articles:
         text = article.get("text", "")
         if not text or not text.strip():
             continue
-        logging.debug("=== Processing article ===")
-        logging.debug(f"Original title: {article.get('title')}")
-        logging.debug(f"Title encoding check: {article.get('title').encode('utf-8')}")
-
-        metadata = {
-            "title": article.get("title"),
-            "url": article.get("url"),
-            "date": article.get("date"),
-            "source_file": article.get("source_file")
-        }
-        docs.append(Document(page_content=text, metadata=metadata))
+        if not article.get("url"):
+            logging.warning(f"Skipping article without URL: {article.get('title')}")
+            continue
+
+        text_hash = content_hash(text)
+        parent_id = document_id(article["url"], text_hash)
+        # MongoDB returns naive UTC datetimes
+        scraped_at = article.get("scraped_at")
+        scraped_ts = scraped_at.replace(tzinfo=timezone.utc).timestamp() if scraped_at else None
+        published_at = article.get("published_at")
+        published_ts = published_at.replace(tzinfo=timezone.utc).timestamp() if published_at else None
+        chunks = split_into_chunks(text, chunk_size, chunk_overlap)
+        for index, chunk in enumerate(chunks):
+            metadata = {
+                "title": article.get("title"),
+                "url": article.get("url"),
+                "date": article.get("date"),
+                "source_file": article.get("source_file"),
+                "sport": article.get("sport") or UNTAGGED,
+                "scraped_ts": scraped_ts,
+                "published_ts": published_ts,
+                "content_hash": text_hash,
+                "parent_id": parent_id,
+                "chunk_index": index,
+                "chunk_count": len(chunks)
+            }
+            metadata = {key: value for key, value in metadata.items() if value is not None}
+            docs.append(Document(page_content=chunk, metadata=metadata))
     return docs
 
 
-def embed_and_store(docs: List[Document], persist_directory: str = "data/vectorstore/chroma"):
+def _token_batches(docs: List[Document], ids: List[str], max_tokens: int,
+                   max_docs: int) -> Iterator[Tuple[List[Document], List[str]]]:
+    batch_docs, batch_ids, batch_tokens = [], [], 0
+    for doc, doc_id in zip(docs, ids):
+        tokens = count_tokens(doc.page_content)
+        if batch_docs and (batch_tokens + tokens > max_tokens or len(batch_docs) >= max_docs):
+            yield batch_docs, batch_ids
+            batch_docs, batch_ids, batch_tokens = [], [], 0
+        batch_docs.append(doc)
+        batch_ids.append(doc_id)
+        batch_tokens += tokens
+    if batch_docs:
+        yield batch_docs, batch_ids
+
+
+def _embed_and_upsert(vectorstore, docs: List[Document], ids: List[str]):
+    """
+    Embeds token-budgeted batches concurrently and writes each batch to the
+    collection as soon as its embeddings arrive; Chroma writes stay on this thread.
+    """
+    embeddings = vectorstore.embeddings
+    batches = list(_token_batches(docs, ids, EMBED_BATCH_TOKENS, EMBED_BATCH_MAX_DOCS))
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(embeddings.embed_documents, [doc.page_content for doc in batch_docs]):
+                (batch_docs, batch_ids)
+            for batch_docs, batch_ids in batches
+        }
+        for future in as_completed(futures):
+            batch_docs, batch_ids = futures[future]
+            vectorstore._collection.upsert(
+                ids=batch_ids,
+                embeddings=future.result(),
+                metadatas=[doc.metadata for doc in batch_docs],
+                documents=[doc.page_content for doc in batch_docs]
+            )
+    logging.info(f"Embedded {len(docs)} chunks in {len(batches)} batches")
+
+
+def embed_and_store(docs: List[Document], persist_directory: str = VECTORSTORE_DIR,
+                    vectorstore=None) -> Dict[str, int]:
+    """
+    Upserts article chunks under deterministic IDs and returns per-run counts of
+    new, updated (content changed for a known URL) and skipped articles.
+    """
+    stats = {"new": 0, "updated": 0, "skipped": 0, "chunks": 0}
     if not docs:
         print("No documents to save")
-        return
+        return stats
+
+    if vectorstore is None:
+        vectorstore = get_vectorstore(persist_directory)
+
+    urls = sorted({doc.metadata["url"] for doc in docs})
+    existing = vectorstore.get(where={"url": {"$in": urls}}, include=["metadatas"])
+    existing_ids_by_url = defaultdict(set)
+    for existing_id, metadata in zip(existing["ids"], existing["metadatas"]):
+        existing_ids_by_url[metadata["url"]].add(existing_id)
+
+    # A URL can appear more than once in a batch (re-scraped after an edit); only its newest version is stored,
+    # by scraped_ts with ties going to the later occurrence
+    newest_parent_by_url = {}
+    for doc in docs:
+        scraped_ts = doc.metadata.get("scraped_ts", 0)
+        current = newest_parent_by_url.get(doc.metadata["url"])
+        if current is None or current[0] == doc.metadata["parent_id"] or scraped_ts >= current[1]:
+            newest_parent_by_url[doc.metadata["url"]] = (doc.metadata["parent_id"], scraped_ts)
+    newest_parents = {parent_id for parent_id, _ in newest_parent_by_url.values()}
+
+    chunks_by_parent = defaultdict(dict)
+    for doc in docs:
+        if doc.metadata["parent_id"] in newest_parents:
+            chunks_by_parent[doc.metadata["parent_id"]][doc.metadata["chunk_index"]] = doc
+
+    to_add, ids_to_add, stale_ids = [], [], set()
+    for parent_id, chunks in chunks_by_parent.items():
+        url = next(iter(chunks.values())).metadata["url"]
+        expected_ids = {chunk_id(parent_id, index) for index in chunks}
+        known_ids = existing_ids_by_url.get(url, set())
+        # Anything else stored for this URL is an older version or a legacy duplicate
+        stale_ids.update(known_ids - expected_ids)
+        if expected_ids <= known_ids:
+            stats["skipped"] += 1
+            continue
+
+        stats["updated" if known_ids else "new"] += 1
+        for index, doc in sorted(chunks.items()):
+            to_add.append(doc)
+            ids_to_add.append(chunk_id(parent_id, index))
 
-    vectorstore = get_vectorstore(persist_directory)
-    vectorstore.add_documents(docs)
-    vectorstore.persist()
-    print(f"Saved {len(docs)} documents to vector database")
+    if to_add:
+        _embed_and_upsert(vectorstore, to_add, ids_to_add)
+    # Old versions are removed only once their replacements are stored
+    if stale_ids:
+        vectorstore.delete(ids=list(stale_ids))
+    if to_add or stale_ids:
+        update_lexical_index(persist_directory, vectorstore, to_add, ids_to_add, stale_ids)
+    stats["chunks"] = len(to_add)
+    print(f"Saved {len(to_add)} chunks to vector database "
+          f"(new: {stats['new']}, updated: {stats['updated']}, skipped: {stats['skipped']}, "
+          f"removed stale: {len(stale_ids)})")
+    return stats
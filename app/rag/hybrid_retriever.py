@@ -0,0 +1,178 @@
+import hashlib
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.sports import UNTAGGED, detect_sports
+
+
+def _doc_key(doc: Document) -> str:
+    # Chunk identity shared by both result lists; legacy chunks without parent_id fall back to URL + text
+    metadata = doc.metadata or {}
+    if metadata.get("parent_id") is not None:
+        return f"{metadata['parent_id']}-{metadata.get('chunk_index', 0)}"
+    text_hash = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+    return f"{metadata.get('url')}#{text_hash}"
+
+
+def build_filter(sports: List[str], min_scraped_ts: Optional[float]) -> Optional[dict]:
+    """Chroma `where` clause restricting a search to the given sports (and untagged chunks) and time window."""
+    conditions = []
+    if sports:
+        conditions.append({"sport": {"$in": list(sports) + [UNTAGGED]}})
+    if min_scraped_ts is not None:
+        conditions.append({"scraped_ts": {"$gte": min_scraped_ts}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _is_recent(metadata: dict, min_scraped_ts: float) -> bool:
+    # Same semantics as the Chroma filter: a chunk without scraped_ts is older than any cutoff
+    return (metadata.get("scraped_ts") or 0) >= min_scraped_ts
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense vector search with BM25 lexical search using Reciprocal
+    Rank Fusion, so exact player names, clubs and scores are found even when
+    the embedding misses them. Fused scores can be boosted for recent
+    articles (half-life in hours, 0 disables).
+
+    Both searches are pre-filtered to the sports the query mentions (when
+    `route_by_sport` is set) and to the last `max_age_days` days, so their
+    cost follows the relevant slice rather than the whole corpus. If the
+    filtered slice returns nothing, the search is repeated unfiltered.
+    With a `vector_index` (see rag.vector_index.ReloadingVectorIndex) the
+    dense pass searches the memory-mapped export instead of Chroma while
+    one is available.
+
+    The query is embedded once and reused by both passes. An optional
+    `timer` (see backend.metrics.StageTimer) passed to `invoke` receives the
+    time spent embedding, in each search and in fusion.
+    """
+
+    vectorstore: Any
+    lexical_index: Any = None
+    vector_index: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    recency_half_life_hours: float = 0.0
+    recency_weight: float = 0.5
+    route_by_sport: bool = True
+    max_age_days: float = 0.0
+
+    def _recency_factor(self, metadata, now):
+        timestamp = metadata.get("published_ts") or metadata.get("scraped_ts")
+        if not self.recency_half_life_hours or timestamp is None:
+            return 1.0
+        age_hours = max(0.0, (now - timestamp) / 3600)
+        return 1.0 + self.recency_weight * 0.5 ** (age_hours / self.recency_half_life_hours)
+
+    def _mapped_index(self):
+        return self.vector_index.get() if self.vector_index is not None else None
+
+    def _dense_search(self, query, vector, sports, min_scraped_ts):
+        index = self._mapped_index()
+        if index is not None and vector is not None:
+            return index.search_documents([vector], self.fetch_k, sports, min_scraped_ts)[0]
+        where = build_filter(sports, min_scraped_ts)
+        if vector is None:
+            return self.vectorstore.similarity_search(query, k=self.fetch_k, filter=where)
+        return self.vectorstore.similarity_search_by_vector(vector, k=self.fetch_k, filter=where)
+
+    def _dense_search_many(self, vectors, sports, min_scraped_ts):
+        # One index or Chroma query for several embeddings that share the same filter
+        index = self._mapped_index()
+        if index is not None:
+            return index.search_documents(vectors, self.fetch_k, sports, min_scraped_ts)
+        collection = getattr(self.vectorstore, "_collection", None)
+        if collection is None:
+            return [self._dense_search(None, vector, sports, min_scraped_ts) for vector in vectors]
+        where = build_filter(sports, min_scraped_ts)
+        result = collection.query(query_embeddings=vectors, n_results=self.fetch_k, where=where,
+                                  include=["documents", "metadatas"])
+        return [
+            [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+            for texts, metadatas in zip(result["documents"], result["metadatas"])
+        ]
+
+    def _search(self, query, vector, sports, min_scraped_ts, stage, dense=None):
+        scores, documents = {}, {}
+
+        if dense is None:
+            with stage("vector_search"):
+                dense = self._dense_search(query, vector, sports, min_scraped_ts)
+        for rank, doc in enumerate(dense):
+            key = _doc_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + self.dense_weight / (self.rrf_k + rank + 1)
+
+        index = self.lexical_index.get() if self.lexical_index is not None else None
+        if index is not None:
+            filter_fn = None
+            if min_scraped_ts is not None:
+                filter_fn = lambda metadata: _is_recent(metadata, min_scraped_ts)
+            with stage("lexical_search"):
+                lexical = index.search(query, self.fetch_k, filter_fn=filter_fn, sports=sports)
+            for rank, (doc_id, _) in enumerate(lexical):
+                doc = index.get_document(doc_id)
+                key = _doc_key(doc)
+                documents.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + self.lexical_weight / (self.rrf_k + rank + 1)
+        return scores, documents
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                timer: Any = None) -> List[Document]:
+        stage = timer.stage if timer is not None else (lambda name: nullcontext())
+        now = time.time()
+        sports = detect_sports(query) if self.route_by_sport else []
+        min_scraped_ts = now - self.max_age_days * 86400 if self.max_age_days else None
+
+        embeddings = getattr(self.vectorstore, "embeddings", None)
+        with stage("embed"):
+            vector = embeddings.embed_query(query) if embeddings is not None else None
+        return self._fuse(query, vector, sports, min_scraped_ts, now, stage)
+
+    def _fuse(self, query, vector, sports, min_scraped_ts, now, stage, dense=None):
+        scores, documents = self._search(query, vector, sports, min_scraped_ts, stage, dense)
+        if not scores and (sports or min_scraped_ts is not None):
+            scores, documents = self._search(query, vector, [], None, stage)
+
+        with stage("fusion"):
+            for key in scores:
+                scores[key] *= self._recency_factor(documents[key].metadata or {}, now)
+            ranked = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [documents[key] for key in ranked]
+
+    def retrieve_many(self, queries: List[str], vectors: List[List[float]], timer: Any = None) -> List[List[Document]]:
+        """
+        Batch retrieval for already embedded queries. Queries routed to the
+        same sports share one vector search call; BM25 and fusion run per query.
+        Returns the documents of each query in input order.
+        """
+        stage = timer.stage if timer is not None else (lambda name: nullcontext())
+        now = time.time()
+        min_scraped_ts = now - self.max_age_days * 86400 if self.max_age_days else None
+        routes = [detect_sports(query) if self.route_by_sport else [] for query in queries]
+
+        groups = defaultdict(list)
+        for index, sports in enumerate(routes):
+            groups[tuple(sports)].append(index)
+        dense = [None] * len(queries)
+        with stage("vector_search"):
+            for sports, indexes in groups.items():
+                dense_results = self._dense_search_many([vectors[i] for i in indexes], list(sports), min_scraped_ts)
+                for index, docs in zip(indexes, dense_results):
+                    dense[index] = docs
+
+        return [self._fuse(query, vectors[index], routes[index], min_scraped_ts, now, stage, dense[index])
+                for index, query in enumerate(queries)]
@@ -0,0 +1,143 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+STATE_FILENAME = "ingest_state.json"
+LOCK_FILENAME = ".store.lock"
+EXPORT_LOCK_FILENAME = ".export.lock"
+
+
+def _state_path(persist_directory):
+    return os.path.join(persist_directory, STATE_FILENAME)
+
+
+def load_state(persist_directory):
+    path = _state_path(persist_directory)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(persist_directory, state):
+    # Write-then-rename so a crash mid-write never leaves a truncated state file
+    os.makedirs(persist_directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".ingest_state.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _state_path(persist_directory))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _file_lock(persist_directory, filename):
+    os.makedirs(persist_directory, exist_ok=True)
+    with open(os.path.join(persist_directory, filename), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def store_lock(persist_directory):
+    """
+    Exclusive lock shared by every process that writes the store (the
+    updater and maintenance). Held around Chroma, BM25 and state writes so
+    their read-modify-write cycles never interleave.
+    Not reentrant: take it once, at the top of a write.
+    """
+    with _file_lock(persist_directory, LOCK_FILENAME):
+        yield
+
+
+@contextmanager
+def export_lock(persist_directory):
+    """
+    Exclusive lock around vector index exports, which only read the
+    collection and so do not hold store_lock: ingestion goes on during an
+    export, but two exports never remove each other's files.
+    """
+    with _file_lock(persist_directory, EXPORT_LOCK_FILENAME):
+        yield
+
+
+def reload_state(persist_directory, state):
+    """Replaces an in-memory state with the one on disk; call under store_lock before changing and saving it."""
+    fresh = load_state(persist_directory)
+    state.clear()
+    state.update(fresh)
+    return state
+
+
+def get_watermark(state):
+    value = state.get("watermark")
+    return datetime.fromisoformat(value) if value else None
+
+
+def set_watermark(state, watermark):
+    state["watermark"] = watermark.isoformat()
+    return state
+
+
+def bump_generation(state):
+    # Readers (e.g. the backend answer cache) compare generations to detect new documents
+    state["generation"] = state.get("generation", 0) + 1
+    return state
+
+
+_generation_cache = {}
+
+
+def read_generation(persist_directory):
+    """
+    Returns the vectorstore generation written by the updater. The file is
+    only re-read when its mtime changes, so this is cheap enough per request.
+    """
+    path = _state_path(persist_directory)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    cached = _generation_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        generation = load_state(persist_directory).get("generation", 0)
+    except (OSError, ValueError):
+        return cached[1] if cached else 0
+    _generation_cache[path] = (mtime, generation)
+    return generation
+
+
+class EmbeddingMismatchError(RuntimeError):
+    pass
+
+
+def check_embedding_signature(state, signature, collection_dimension=None):
+    """
+    Refuses embeddings other than the ones the vectorstore was built with:
+    compares `signature` ({"model", "dimension"}) with the one the updater
+    recorded in the state, or, for stores built before signatures were
+    recorded, the dimension with that of a stored vector.
+    """
+    stored = state.get("embedding")
+    if stored and stored != signature:
+        raise EmbeddingMismatchError(
+            f"Baza wektorowa zbudowana embeddingami {stored['model']} ({stored['dimension']} wym.), "
+            f"skonfigurowano {signature['model']} ({signature['dimension']} wym.); "
+            f"ustaw ten sam EMBEDDING_BACKEND albo zbuduj bazę od nowa"
+        )
+    if not stored and collection_dimension and collection_dimension != signature["dimension"]:
+        raise EmbeddingMismatchError(
+            f"Baza wektorowa zawiera wektory o wymiarze {collection_dimension}, "
+            f"skonfigurowane embeddingi {signature['model']} mają wymiar {signature['dimension']}"
+        )
@@ -1,7 +1,9 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from pymongo import MongoClient
 import os
+from rag.article_feed import ARTICLE_PROJECTION
+from rag.config import INGEST_BATCH_SIZE
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,34 +17,36 @@ client = MongoClient(mongodb_uri, unicode_decode_error_handler='ignore')
 db = client['scraper_db']
 articles_collection = db['articles']
 
-def load_articles():
-    today = datetime.utcnow()
-    start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
-
+def iter_article_batches(since=None, batch_size=INGEST_BATCH_SIZE):
+    """
+    Yields lists of at most `batch_size` articles scraped at or after
+    `since`, oldest first, fetching only the fields the updater needs.
+    Without a watermark the window starts at the beginning of the current
+    UTC day. Only one batch is held in memory at a time.
+    """
+    if since is None:
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    cursor = articles_collection.find(
+        {'scraped_at': {'$gte': since}},
+        ARTICLE_PROJECTION,
+        sort=[('scraped_at', 1)],
+        batch_size=batch_size
+    )
+    total = 0
+    batch = []
     try:
-        cursor = articles_collection.find(
-            {
-                'scraped_at': {
-                    '$gte': start_of_day,
-                    '$lt': end_of_day
-                }
-            },
-            collation={'locale': 'pl'}
-        )
-
-        articles = list(cursor)
-
-        for article in articles:
-            if 'title' in article:
-                article['title'] = article['title'].encode('utf-8').decode('utf-8')
-            if 'text' in article:
-                article['text'] = article['text'].encode('utf-8').decode('utf-8')
-
-        logger.info(f"Total articles loaded from MongoDB: {len(articles)}")
-
+        for article in cursor:
+            batch.append(article)
+            if len(batch) >= batch_size:
+                total += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            total += len(batch)
+            yield batch
     except Exception as e:
         logger.error(f"Error loading articles from MongoDB: {e}")
-        return []
-
-    return articles
\ No newline at end of file
+    finally:
+        cursor.close()
+    logger.info(f"Total articles loaded from MongoDB since {since}: {total}")
@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    CPU embeddings from a sentence-transformers model, e.g. the multilingual
+    paraphrase-multilingual-MiniLM-L12-v2 that handles Polish. No network
+    access is needed once the model is downloaded.
+
+    Documents are encoded in batches of `batch_size`, spread over `workers`
+    threads; torch and onnxruntime release the GIL during inference, and
+    the cores are split between the workers so they do not oversubscribe
+    the CPU. Queries are encoded directly on the calling thread. The model
+    is warmed up at construction so the first request does not pay for it.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, workers: int = 2, runtime: str = "torch",
+                 device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=local wymaga pakietu sentence-transformers "
+                              "(pip install sentence-transformers)") from e
+
+        self.model = model_name
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        if runtime == "torch":
+            import torch
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+        self._model = SentenceTransformer(model_name, device=device, backend=runtime)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+        # Renamed to get_embedding_dimension in newer sentence-transformers releases
+        get_dimension = getattr(self._model, "get_embedding_dimension", None) or \
+            self._model.get_sentence_embedding_dimension
+        self.dimension = get_dimension()
+
+        started = time.perf_counter()
+        self.embed_query("Rozgrzewka modelu")
+        logger.info(f"Loaded local embedding model {model_name} ({self.dimension} dims), "
+                    f"warm-up took {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                     convert_to_numpy=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= self.batch_size:
+            return self._encode(texts) if texts else []
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        vectors = []
+        for batch_vectors in self._executor.map(self._encode, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
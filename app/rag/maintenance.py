@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from rag.bm25_index import append_delta
+from rag.embed_and_store import chunk_id
+from rag.sports import UNTAGGED
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 5000
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def hnsw_size(persist_directory):
+    """Bytes of Chroma's HNSW segment directories (the ones holding data_level0.bin)."""
+    total = 0
+    for name in os.listdir(persist_directory):
+        path = os.path.join(persist_directory, name)
+        if os.path.exists(os.path.join(path, "data_level0.bin")):
+            total += directory_size(path)
+    return total
+
+
+def probe_query_latency(collection, samples=20, k=5):
+    """
+    Times nearest-neighbour queries using vectors already stored in the
+    collection as probes, so no embedding API call is needed.
+    """
+    stored = collection.get(limit=samples, include=["embeddings"])
+    vectors = stored.get("embeddings")
+    if vectors is None or len(vectors) == 0:
+        return None
+    timings = []
+    for vector in vectors:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[list(vector)], n_results=k)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(statistics.median(timings), 2), "max_ms": round(max(timings), 2)}
+
+
+def _iter_entries(collection, include):
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=include)
+        if not page["ids"]:
+            return
+        for index, doc_id in enumerate(page["ids"]):
+            yield doc_id, {key: page[key][index] for key in include}
+        offset += len(page["ids"])
+
+
+def find_duplicates(collection):
+    """
+    Returns IDs of vectors to drop: copies with the same URL and content
+    (and chunk index), plus legacy entries of URLs that already have chunks
+    stored under deterministic IDs.
+    """
+    groups = defaultdict(list)
+    urls_with_chunks = set()
+    legacy_by_url = defaultdict(list)
+    for doc_id, entry in _iter_entries(collection, ["metadatas", "documents"]):
+        metadata = entry["metadatas"] or {}
+        url = metadata.get("url")
+        if metadata.get("parent_id"):
+            urls_with_chunks.add(url)
+            key = (url, metadata.get("content_hash"), metadata.get("chunk_index", 0))
+        else:
+            legacy_by_url[url].append(doc_id)
+            key = (url, hashlib.sha256((entry["documents"] or "").strip().encode("utf-8")).hexdigest(), None)
+        groups[key].append((doc_id, metadata))
+
+    duplicates = set()
+    for (url, _, chunk_index), entries in groups.items():
+        if len(entries) < 2:
+            continue
+        # Prefer the copy stored under the deterministic ID the updater would write today
+        keep = entries[0][0]
+        for doc_id, metadata in entries:
+            if metadata.get("parent_id") and doc_id == chunk_id(metadata["parent_id"], chunk_index):
+                keep = doc_id
+                break
+        duplicates.update(doc_id for doc_id, _ in entries if doc_id != keep)
+    for url in urls_with_chunks:
+        duplicates.update(legacy_by_url.get(url, []))
+    return duplicates
+
+
+def find_expired(collection, cutoff_ts, legacy_scraped_ts=None):
+    """
+    Returns {id: (document, metadata)} for chunks scraped before the cutoff.
+    Chunks stored without scraped_ts count as scraped at legacy_scraped_ts,
+    and never expire without it.
+    """
+    expired = {}
+    for doc_id, entry in _iter_entries(collection, ["metadatas", "documents"]):
+        metadata = entry["metadatas"] or {}
+        scraped_ts = metadata.get("scraped_ts", legacy_scraped_ts)
+        if scraped_ts is not None and scraped_ts < cutoff_ts:
+            expired[doc_id] = (entry["documents"], metadata)
+    return expired
+
+
+def backfill_sport(collection):
+    """
+    Stores rag.sports.UNTAGGED as the sport of chunks stored without one,
+    so Chroma's sport filter lets them through; returns how many were
+    updated.
+    """
+    ids, metadatas = [], []
+    for doc_id, entry in _iter_entries(collection, ["metadatas"]):
+        metadata = entry["metadatas"] or {}
+        if metadata.get("sport") is None:
+            ids.append(doc_id)
+            metadatas.append(dict(metadata, sport=UNTAGGED))
+    for start in range(0, len(ids), PAGE_SIZE):
+        collection.update(ids=ids[start:start + PAGE_SIZE], metadatas=metadatas[start:start + PAGE_SIZE])
+    return len(ids)
+
+
+def archive_jsonl(path, records):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    return count
+
+
+def vacuum_sqlite(persist_directory):
+    """
+    Reclaims space freed by deletions in Chroma's SQLite file. Needs a
+    moment of exclusive access, so it is skipped if another process holds a lock.
+    """
+    path = os.path.join(persist_directory, "chroma.sqlite3")
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        return True
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Skipping VACUUM of {path}: {e}")
+        return False
+
+
+def expire_mongo_articles(collection, cutoff, archive_path=None, dry_run=False):
+    query = {"scraped_at": {"$lt": cutoff}}
+    if dry_run:
+        return collection.count_documents(query)
+    if archive_path:
+        archive_jsonl(archive_path, collection.find(query))
+    return collection.delete_many(query).deleted_count
+
+
+def run_maintenance(vectorstore, persist_directory, retention_days, archive_dir=None, articles_collection=None,
+                    dry_run=False, legacy_scraped_ts=None):
+    """
+    Dedupes and expires chunks and compacts the store. Writes to the BM25
+    index, so the caller must hold rag.ingest_state.store_lock. Chunks
+    without scraped_ts expire as if scraped at legacy_scraped_ts. Only the
+    SQLite file is compacted: the HNSW segment files keep their size, which
+    the report gives as "hnsw_bytes".
+    """
+    collection = vectorstore._collection
+    report = {
+        "before": {
+            "bytes": directory_size(persist_directory),
+            "hnsw_bytes": hnsw_size(persist_directory),
+            "vectors": collection.count(),
+            "latency": probe_query_latency(collection)
+        },
+        "dry_run": dry_run
+    }
+
+    duplicates = find_duplicates(collection)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days) if retention_days else None
+    expired = find_expired(collection, (cutoff - datetime(1970, 1, 1)).total_seconds(),
+                           legacy_scraped_ts) if cutoff else {}
+    expired = {doc_id: value for doc_id, value in expired.items() if doc_id not in duplicates}
+    report["duplicates_removed"] = len(duplicates)
+    report["expired_removed"] = len(expired)
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    if not dry_run:
+        if archive_dir and expired:
+            archive_jsonl(
+                os.path.join(archive_dir, f"vectors-{stamp}.jsonl.gz"),
+                ({"id": doc_id, "document": document, "metadata": metadata}
+                 for doc_id, (document, metadata) in expired.items())
+            )
+        removed = list(duplicates) + list(expired)
+        for start in range(0, len(removed), PAGE_SIZE):
+            collection.delete(ids=removed[start:start + PAGE_SIZE])
+
+        if removed:
+            append_delta(persist_directory, removed_ids=removed)
+        report["vacuumed"] = vacuum_sqlite(persist_directory)
+
+    if articles_collection is not None and cutoff:
+        archive_path = os.path.join(archive_dir, f"articles-{stamp}.jsonl.gz") if archive_dir else None
+        report["articles_expired"] = expire_mongo_articles(articles_collection, cutoff, archive_path, dry_run)
+
+    report["after"] = {
+        "bytes": directory_size(persist_directory),
+        "hnsw_bytes": hnsw_size(persist_directory),
+        "vectors": collection.count(),
+        "latency": probe_query_latency(collection)
+    }
+    return report
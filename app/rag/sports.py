@@ -0,0 +1,39 @@
+import re
+import unicodedata
+
+# Keyword prefixes (lowercase, without Polish diacritics) that route a query to a sport section.
+# Keys are the slugs of the scraped sections, see scrapper/scrap_sports.py sports_list.
+SPORT_KEYWORDS = {
+    "pilka-nozna": ["nozn", "futbol", "football", "ekstraklas", "liga mistrzow", "champions league",
+                    "premier league", "la liga", "bundesliga", "serie a", "mundial", "reprezentacj"],
+    "tenis": ["tenis", "wimbledon", "roland garros", "us open", "australian open", "atp", "wta"],
+    "siatkowka": ["siatk", "plusliga", "tauron liga", "volley"],
+    "lekkoatletyka": ["lekkoatlet", "maraton", "sprint", "tyczk", "mlot", "oszczep", "diamentowa liga"],
+    "koszykowka": ["koszyk", "nba", "euroliga", "euroleague", "basket"],
+    "pilka-reczna": ["reczn", "szczypiorn", "handball"],
+}
+
+# Sport stored for chunks of articles without a section (meczyki.pl, chunks stored before sports were tagged);
+# they pass every sport filter, since the query's sport cannot be ruled out for them
+UNTAGGED = ""
+
+_PATTERNS = {
+    sport: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")")
+    for sport, keywords in SPORT_KEYWORDS.items()
+}
+
+
+def _fold(text):
+    text = text.casefold().replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def section_slug(section_path):
+    """'/436306/tenis' -> 'tenis'"""
+    return section_path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def detect_sports(query):
+    """Returns the slugs of all sports the query mentions, in SPORT_KEYWORDS order."""
+    folded = _fold(query)
+    return [sport for sport, pattern in _PATTERNS.items() if pattern.search(folded)]
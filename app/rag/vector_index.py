@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.ingest_state import export_lock
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "vector_index.json"
+DIRECTORY_PREFIX = "vector_index-"
+DTYPES = ("float32", "float16", "int8")
+EXPORT_PAGE_SIZE = 5000
+# Rows scored per step; bounds the float32 copy made of quantized rows
+SEARCH_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def _manifest_path(persist_directory):
+    return os.path.join(persist_directory, MANIFEST_FILENAME)
+
+
+def _write_manifest(persist_directory, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".vector_index.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _manifest_path(persist_directory))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_manifest(persist_directory):
+    path = _manifest_path(persist_directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_old_exports(persist_directory, keep):
+    for name in os.listdir(persist_directory):
+        if name.startswith((DIRECTORY_PREFIX, ".vector_index.")) and name not in keep:
+            path = os.path.join(persist_directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def has_vector_index(persist_directory):
+    return os.path.exists(_manifest_path(persist_directory))
+
+
+def remove_vector_index(persist_directory):
+    """Drops the export so readers fall back to Chroma instead of serving a stale copy."""
+    with export_lock(persist_directory):
+        _remove_vector_index(persist_directory)
+
+
+def _remove_vector_index(persist_directory):
+    if os.path.exists(_manifest_path(persist_directory)):
+        os.remove(_manifest_path(persist_directory))
+    _remove_old_exports(persist_directory, keep=())
+
+
+def export_vector_index(persist_directory, collection, dtype="float16"):
+    """
+    Writes the Chroma collection as a read-optimized index next to it:
+    unit-length vectors in one contiguous .npy matrix (float32, float16, or
+    int8 with a per-row scale), the filter fields as arrays and the chunk
+    texts and metadata as JSON lines addressed by an offsets array. Each
+    export goes to a new directory and is published by atomically
+    replacing the manifest, so readers never see a half-written index.
+    Exports run one at a time under rag.ingest_state.export_lock, since each
+    removes the other exports' directories, but without the store lock:
+    chunks stored or removed while the collection is paged through may be
+    missed until the next export.
+    Returns the manifest, or None for an empty collection.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown vector index dtype: {dtype} (expected one of {', '.join(DTYPES)})")
+    with export_lock(persist_directory):
+        return _export_vector_index(persist_directory, collection, dtype)
+
+
+def _export_vector_index(persist_directory, collection, dtype):
+    count = collection.count()
+    if not count:
+        _remove_vector_index(persist_directory)
+        return None
+
+    started = time.perf_counter()
+    work_dir = tempfile.mkdtemp(dir=persist_directory, prefix=".vector_index.")
+    try:
+        vectors = scales = None
+        scraped_ts = np.lib.format.open_memmap(os.path.join(work_dir, "scraped_ts.npy"), mode="w+",
+                                               dtype=np.float64, shape=(count,))
+        sport_codes = np.lib.format.open_memmap(os.path.join(work_dir, "sport.npy"), mode="w+",
+                                                dtype=np.int16, shape=(count,))
+        offsets = np.lib.format.open_memmap(os.path.join(work_dir, "offsets.npy"), mode="w+",
+                                            dtype=np.int64, shape=(count + 1,))
+        sports = {}
+        row = 0
+        with open(os.path.join(work_dir, "documents.jsonl"), "wb") as documents:
+            # The arrays are sized from the count taken above; chunks stored since then wait for the next export
+            while row < count:
+                page = collection.get(limit=min(EXPORT_PAGE_SIZE, count - row), offset=row,
+                                      include=["embeddings", "documents", "metadatas"])
+                if not len(page["ids"]):
+                    break
+                page_vectors = np.asarray(page["embeddings"], dtype=np.float32)
+                norms = np.linalg.norm(page_vectors, axis=1, keepdims=True)
+                page_vectors /= np.where(norms > 0, norms, 1.0)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(os.path.join(work_dir, "vectors.npy"), mode="w+",
+                                                        dtype=np.dtype(dtype), shape=(count, page_vectors.shape[1]))
+                    if dtype == "int8":
+                        scales = np.lib.format.open_memmap(os.path.join(work_dir, "scales.npy"), mode="w+",
+                                                           dtype=np.float32, shape=(count,))
+
+                end = row + len(page_vectors)
+                if dtype == "int8":
+                    page_scales = np.abs(page_vectors).max(axis=1) / 127
+                    page_scales[page_scales == 0] = 1.0
+                    vectors[row:end] = np.rint(page_vectors / page_scales[:, None]).astype(np.int8)
+                    scales[row:end] = page_scales
+                else:
+                    vectors[row:end] = page_vectors
+
+                for index, (doc_id, text, metadata) in enumerate(
+                        zip(page["ids"], page["documents"], page["metadatas"]), start=row):
+                    metadata = metadata or {}
+                    # Same semantics as the Chroma filter: a chunk without scraped_ts is older than any cutoff
+                    scraped_ts[index] = metadata.get("scraped_ts") or 0.0
+                    sport = metadata.get("sport")
+                    sport_codes[index] = sports.setdefault(sport, len(sports)) if sport else -1
+                    offsets[index] = documents.tell()
+                    documents.write(json.dumps({"id": doc_id, "page_content": text, "metadata": metadata},
+                                               ensure_ascii=False).encode("utf-8") + b"\n")
+                row = end
+            offsets[row] = documents.tell()
+
+        if vectors is None:
+            # Everything was removed after the count was taken
+            del scraped_ts, sport_codes, offsets
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _remove_vector_index(persist_directory)
+            return None
+        for array in (vectors, scales, scraped_ts, sport_codes, offsets):
+            if array is not None:
+                array.flush()
+        manifest = {
+            "directory": f"{DIRECTORY_PREFIX}{time.time_ns()}",
+            "dtype": dtype,
+            "count": row,
+            "dimension": int(vectors.shape[1]),
+            "sports": list(sports),
+        }
+        del vectors, scales, scraped_ts, sport_codes, offsets
+        os.rename(work_dir, os.path.join(persist_directory, manifest["directory"]))
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    previous = _read_manifest(persist_directory)
+    _write_manifest(persist_directory, manifest)
+    # Keep the previous export: a reader may have read the old manifest and not opened its files yet
+    _remove_old_exports(persist_directory, keep={manifest["directory"], (previous or {}).get("directory")})
+    logger.info(f"Exported {row} vectors ({dtype}) to the vector index in {time.perf_counter() - started:.1f} s")
+    return manifest
+
+
+class VectorIndex:
+    """
+    Exact cosine top-k search over an exported index. Every file is
+    memory-mapped, so opening is instant and all backend workers share the
+    same page-cached vectors instead of each loading a copy.
+    """
+
+    def __init__(self, directory, manifest):
+        self.manifest = manifest
+        self.dtype = manifest["dtype"]
+        self.sports = {sport: code for code, sport in enumerate(manifest["sports"])}
+        count = manifest["count"]
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")[:count]
+        self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")[:count] \
+            if self.dtype == "int8" else None
+        self.scraped_ts = np.load(os.path.join(directory, "scraped_ts.npy"), mmap_mode="r")[:count]
+        self.sport_codes = np.load(os.path.join(directory, "sport.npy"), mmap_mode="r")[:count]
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.documents = np.memmap(os.path.join(directory, "documents.jsonl"), dtype=np.uint8, mode="r") \
+            if self.offsets[count] else np.zeros(0, dtype=np.uint8)
+        self.block_rows = max(1, SEARCH_BLOCK_BYTES // (4 * self.vectors.shape[1]))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def open(cls, persist_directory):
+        manifest = _read_manifest(persist_directory)
+        if manifest is None:
+            return None
+        return cls(os.path.join(persist_directory, manifest["directory"]), manifest)
+
+    def _rows(self, sports, min_scraped_ts):
+        # Row numbers passing the filter, or None for all rows
+        mask = None
+        if sports:
+            # -1: chunks without a sport pass every sport filter
+            codes = [self.sports[sport] for sport in sports if sport in self.sports] + [-1]
+            mask = np.isin(self.sport_codes, codes)
+        if min_scraped_ts is not None:
+            recent = self.scraped_ts >= min_scraped_ts
+            mask = recent if mask is None else mask & recent
+        return None if mask is None else np.flatnonzero(mask)
+
+    def search(self, vectors, k, sports=None, min_scraped_ts=None):
+        """
+        Returns, for each query vector, up to k (row, score) pairs by cosine
+        similarity, best first, among the rows matching the sport and time
+        filter. Scores rows in blocks so quantized rows are widened to
+        float32 a block at a time.
+        """
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+        rows = self._rows(sports, min_scraped_ts)
+        total = len(self.vectors) if rows is None else len(rows)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, self.block_rows):
+            block_rows = np.arange(start, min(start + self.block_rows, total)) if rows is None \
+                else rows[start:start + self.block_rows]
+            block = self.vectors[start:start + len(block_rows)] if rows is None else self.vectors[block_rows]
+            scores = queries @ block.astype(np.float32, copy=False).T
+            if self.scales is not None:
+                scores *= self.scales[block_rows]
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return [
+            [(int(row), float(score)) for row, score in zip(hit_rows, hit_scores)]
+            for hit_rows, hit_scores in zip(np.take_along_axis(best_rows, order, axis=1),
+                                      np.take_along_axis(best_scores, order, axis=1))
+        ]
+
+    def get_document(self, row):
+        record = json.loads(bytes(self.documents[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8"))
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    def search_documents(self, vectors, k, sports=None, min_scraped_ts=None):
+        return [[self.get_document(row) for row, _ in hits]
+                for hits in self.search(vectors, k, sports, min_scraped_ts)]
+
+
+class ReloadingVectorIndex:
+    """
+    Read side for the backend: maps the exported index and re-maps it when
+    the updater publishes a new export (the manifest changes).
+    """
+
+    def __init__(self, persist_directory):
+        self.persist_directory = persist_directory
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(_manifest_path(self.persist_directory)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._index = VectorIndex.open(self.persist_directory)
+                    except Exception as e:
+                        logger.error(f"Could not open vector index: {e}")
+                        self._index = None
+                    self._mtime = mtime
+        return self._index
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """Dense-only retriever over the memory-mapped index."""
+
+    index: Any
+    embeddings: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        index = self.index.get() if isinstance(self.index, ReloadingVectorIndex) else self.index
+        if index is None:
+            return []
+        return index.search_documents([self.embeddings.embed_query(query)], self.k)[0]
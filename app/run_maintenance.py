@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from rag.config import get_vectorstore, VECTORSTORE_DIR, VECTOR_INDEX_DTYPE
+from rag.ingest_state import load_state, save_state, bump_generation, store_lock, get_watermark
+from rag.maintenance import run_maintenance
+from rag.vector_index import export_vector_index, has_vector_index
+
+def legacy_scraped_ts(state):
+    """
+    Scrape time assumed for chunks stored without scraped_ts: the updater's
+    watermark (or now) at the first maintenance run, kept in the state so
+    those chunks expire --days after it instead of never.
+    """
+    if "legacy_scraped_ts" not in state:
+        # MongoDB returns naive UTC datetimes
+        watermark = get_watermark(state)
+        seen_at = watermark.replace(tzinfo=timezone.utc) if watermark else datetime.now(timezone.utc)
+        state["legacy_scraped_ts"] = seen_at.timestamp()
+    return state["legacy_scraped_ts"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Retencja i kompaktowanie bazy wektorowej oraz artykułów w MongoDB.")
+    parser.add_argument("--days", type=float, default=float(os.getenv("RETENTION_DAYS", "90")),
+                        help="Usuń dokumenty starsze niż N dni (0 = bez limitu)")
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "data/archive"),
+                        help="Katalog na archiwum .jsonl.gz usuwanych dokumentów (pusty = bez archiwum)")
+    parser.add_argument("--no-mongo", action="store_true", help="Nie usuwaj artykułów z MongoDB")
+    parser.add_argument("--dry-run", action="store_true", help="Tylko policz, nic nie usuwaj")
+    args = parser.parse_args()
+
+    articles_collection = None
+    if not args.no_mongo:
+        from rag.load_articles import articles_collection
+
+    vectorstore = get_vectorstore(VECTORSTORE_DIR)
+    # The --follow updater may be running: it pauses its writes until maintenance releases the lock
+    with store_lock(VECTORSTORE_DIR):
+        state = load_state(VECTORSTORE_DIR)
+        new_legacy_ts = "legacy_scraped_ts" not in state
+        report = run_maintenance(
+            vectorstore,
+            VECTORSTORE_DIR,
+            retention_days=args.days,
+            archive_dir=args.archive_dir or None,
+            articles_collection=articles_collection,
+            dry_run=args.dry_run,
+            legacy_scraped_ts=legacy_scraped_ts(state)
+        )
+        changed = not args.dry_run and (report["duplicates_removed"] or report["expired_removed"])
+        if changed:
+            bump_generation(state)
+        if changed or (new_legacy_ts and not args.dry_run):
+            save_state(VECTORSTORE_DIR, state)
+    # The export only reads the store, so the updater may resume storing batches meanwhile
+    if changed and VECTOR_INDEX_DTYPE and has_vector_index(VECTORSTORE_DIR):
+        export_vector_index(VECTORSTORE_DIR, vectorstore._collection, VECTOR_INDEX_DTYPE)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"Uwaga: VACUUM kompaktuje tylko chroma.sqlite3. Pliki HNSW "
+          f"({report['after']['hnsw_bytes'] / (1024 * 1024):.1f} MB) zachowują rozmiar po usunięciu wektorów; "
+          f"miejsce odzyska dopiero przebudowa bazy (usunięcie wolumenu vectorstore_data i ponowne uruchomienie "
+          f"aktualizatora).")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,225 @@
-from rag.load_articles import load_articles
+import argparse
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from rag.config import (VECTORSTORE_DIR, INGEST_OVERLAP_SECONDS, ARTICLE_FEED, FOLLOW_BATCH_SIZE,
+                        FOLLOW_MAX_WAIT_SECONDS, FOLLOW_CATCH_UP_INTERVAL_SECONDS, FOLLOW_RETRY_SECONDS, VECTOR_INDEX_DTYPE, VECTOR_INDEX_EXPORT_INTERVAL_SECONDS,
+                        DIGESTS, DIGEST_MAX_AGE_HOURS, DIGEST_ARTICLES, get_vectorstore, get_digest_llm,
+                        embedding_signature, collection_dimension)
+from rag.ingest_state import (load_state, save_state, reload_state, store_lock, get_watermark, set_watermark,
+                              bump_generation, check_embedding_signature)
+from rag.load_articles import iter_article_batches, db, articles_collection
+from rag.article_feed import open_feed
 from rag.embed_and_store import process_articles, embed_and_store
+from rag.vector_index import export_vector_index, has_vector_index, remove_vector_index
+from rag.digests import refresh_digests, remove_digests
+from rag.maintenance import backfill_sport
 
-def main():
-    articles = load_articles()
+def ingest(articles, state, vectorstore=None):
+    """Embeds and stores the articles and advances the watermark; returns True if the state changed."""
     docs = process_articles(articles)
+    changed = False
     if docs:
-        embed_and_store(docs)
-        print(f"Zapisano {len(docs)} dokumentów do wektorowej bazy.")
-    else:
+        stats = embed_and_store(docs, VECTORSTORE_DIR, vectorstore=vectorstore)
+        print(f"Nowe: {stats['new']}, zaktualizowane: {stats['updated']}, pominięte: {stats['skipped']}.")
+        if stats["new"] or stats["updated"]:
+            bump_generation(state)
+            changed = True
+
+    watermark = get_watermark(state)
+    scraped_at = [article["scraped_at"] for article in articles if article.get("scraped_at")]
+    if scraped_at:
+        latest = max(scraped_at)
+        if watermark is None or latest > watermark:
+            set_watermark(state, latest)
+            changed = True
+    return changed
+
+def open_checked_vectorstore(state):
+    """
+    Opens the vectorstore, refusing embeddings other than the ones it was
+    built with, and records them. On first start also tags chunks stored
+    without a sport, so the backend's sport filter does not hide them.
+    """
+    vectorstore = get_vectorstore()
+    signature = embedding_signature(vectorstore.embeddings)
+    with store_lock(VECTORSTORE_DIR):
+        reload_state(VECTORSTORE_DIR, state)
+        check_embedding_signature(state, signature, collection_dimension(vectorstore))
+        changed = False
+        if state.get("embedding") != signature:
+            state["embedding"] = signature
+            changed = True
+        if not state.get("sport_backfilled"):
+            tagged = backfill_sport(vectorstore._collection)
+            if tagged:
+                print(f"Oznaczono {tagged} fragmentów bez dyscypliny jako nieprzypisane.")
+            state["sport_backfilled"] = True
+            changed = True
+        if changed:
+            save_state(VECTORSTORE_DIR, state)
+    return vectorstore
+
+def export_index(vectorstore):
+    """
+    Publishes the memory-mapped vector index read by the backend, or drops
+    it when disabled. Only reads the collection, so it does not take the
+    store lock and batches keep being stored meanwhile.
+    """
+    if not VECTOR_INDEX_DTYPE:
+        remove_vector_index(VECTORSTORE_DIR)
+        return
+    manifest = export_vector_index(VECTORSTORE_DIR, vectorstore._collection, VECTOR_INDEX_DTYPE)
+    if manifest:
+        print(f"Indeks wektorowy ({VECTOR_INDEX_DTYPE}) wyeksportowany: {manifest['count']} wektorów.")
+
+def warm_up(state, vectorstore, llm=None):
+    """Regenerates the per-sport digests the backend serves for generic questions, or drops them when disabled."""
+    if not DIGESTS:
+        remove_digests(VECTORSTORE_DIR)
+        return
+    try:
+        llm = llm or get_digest_llm()
+    except ValueError as e:
+        print(f"Pominięto odświeżanie podsumowań: {e}")
+        return
+    store = refresh_digests(llm, vectorstore._collection, VECTORSTORE_DIR, state.get("generation", 0),
+                            max_age_hours=DIGEST_MAX_AGE_HOURS, max_articles=DIGEST_ARTICLES)
+    print(f"Podsumowania dyscyplin odświeżone w {store['refresh_seconds']:.1f} s "
+          f"(wygenerowane: {store['regenerated']}, dostępne: {len(store['digests'])}).")
+
+def publish(state, vectorstore):
+    """
+    Makes new documents visible to the backend's read paths: the vector
+    index and the sport digests. A failure is reported and left for the
+    next publish, so it never stops ingestion.
+    """
+    try:
+        export_index(vectorstore)
+    except Exception as e:
+        print(f"Błąd eksportu indeksu wektorowego: {e}")
+    try:
+        warm_up(state, vectorstore)
+    except Exception as e:
+        print(f"Błąd odświeżania podsumowań dyscyplin: {e}")
+
+def start_publish(state, vectorstore):
+    """Runs publish in a background thread, on a snapshot of the state, so ingestion goes on meanwhile."""
+    thread = threading.Thread(target=publish, args=(dict(state), vectorstore), name="publish", daemon=True)
+    thread.start()
+    return thread
+
+def ingest_batch(articles, state, vectorstore, feed=None):
+    """
+    Stores one batch under the store lock, starting from the state on disk
+    so changes made by a concurrent maintenance run are kept, and saves the
+    state (with the feed position, if any) only once the batch is stored.
+    """
+    with store_lock(VECTORSTORE_DIR):
+        reload_state(VECTORSTORE_DIR, state)
+        changed = ingest(articles, state, vectorstore)
+        if feed is not None:
+            state[feed.state_key] = feed.position
+        if changed or feed is not None:
+            save_state(VECTORSTORE_DIR, state)
+
+def load_since_watermark(state, vectorstore):
+    """
+    Stores everything scraped since the watermark, one batch at a time;
+    returns the number of articles read. Batches come in scraped_at order,
+    so an interrupted run resumes where it stopped.
+    """
+    watermark = get_watermark(state)
+    since = watermark - timedelta(seconds=INGEST_OVERLAP_SECONDS) if watermark else None
+    loaded = 0
+    for articles in iter_article_batches(since=since):
+        loaded += len(articles)
+        ingest_batch(articles, state, vectorstore)
+    return loaded
+
+def catch_up(state, vectorstore):
+    """Stores everything scraped since the watermark and publishes it if anything changed."""
+    generation = state.get("generation", 0)
+    loaded = load_since_watermark(state, vectorstore)
+    if not loaded:
         print("Brak nowych dokumentów do przetworzenia.")
+    if state.get("generation", 0) != generation or has_vector_index(VECTORSTORE_DIR) != bool(VECTOR_INDEX_DTYPE):
+        publish(state, vectorstore)
+
+def follow(state, feed, stop, vectorstore=None):
+    """
+    Long-lived consumer: stores new articles in micro-batches as the feed
+    delivers them. The next batch is only pulled once the previous one is
+    stored, so a burst of scraping queues up in MongoDB, not in memory.
+    The vector index and the digests are refreshed in the background, one
+    refresh at a time and at most once per export interval.
+
+    A batch that fails to store is retried, without saving the feed
+    position, until it succeeds; every FOLLOW_CATCH_UP_INTERVAL_SECONDS the
+    watermark catch-up runs again for articles whose feed event was lost.
+    """
+    exported_generation = state.get("generation", 0)
+    exported_at = caught_up_at = time.monotonic()
+    publishing = None
+    pending = None
+    try:
+        while not stop.is_set():
+            if (state.get("generation", 0) != exported_generation
+                    and time.monotonic() - exported_at >= VECTOR_INDEX_EXPORT_INTERVAL_SECONDS
+                    and not (publishing and publishing.is_alive())):
+                publishing = start_publish(state, vectorstore)
+                exported_generation = state.get("generation", 0)
+                exported_at = time.monotonic()
+            if pending is None and time.monotonic() - caught_up_at >= FOLLOW_CATCH_UP_INTERVAL_SECONDS:
+                caught_up_at = time.monotonic()
+                try:
+                    load_since_watermark(state, vectorstore)
+                except Exception as e:
+                    print(f"Błąd okresowego doładowania artykułów: {e}")
+            articles = pending or feed.poll(FOLLOW_BATCH_SIZE, FOLLOW_MAX_WAIT_SECONDS)
+            if not articles:
+                continue
+            started = time.monotonic()
+            try:
+                ingest_batch(articles, state, vectorstore, feed)
+            except Exception as e:
+                print(f"Błąd zapisu partii {len(articles)} artykułów, ponowna próba za {FOLLOW_RETRY_SECONDS:.0f} s: {e}")
+                pending = articles
+                stop.wait(FOLLOW_RETRY_SECONDS)
+                continue
+            pending = None
+            oldest = min((article["scraped_at"] for article in articles if article.get("scraped_at")), default=None)
+            lag = f", opóźnienie od scrapingu: {(datetime.utcnow() - oldest).total_seconds():.1f} s" if oldest else ""
+            print(f"Partia {len(articles)} artykułów zapisana w {time.monotonic() - started:.1f} s{lag}.")
+    finally:
+        if publishing is not None:
+            publishing.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Embeds new articles from MongoDB into the vector store.")
+    parser.add_argument("--follow", action="store_true",
+                        help="Keep running and store new articles as soon as they are scraped")
+    args = parser.parse_args()
+
+    state = load_state(VECTORSTORE_DIR)
+    vectorstore = open_checked_vectorstore(state)
+    if not args.follow:
+        catch_up(state, vectorstore)
+        return
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    # Open the feed before the catch-up so nothing inserted in between is missed
+    feed = open_feed(db, articles_collection, state, ARTICLE_FEED)
+    try:
+        catch_up(state, vectorstore)
+        print(f"Nasłuchiwanie nowych artykułów ({type(feed).__name__})...")
+        follow(state, feed, stop, vectorstore)
+    finally:
+        feed.close()
 
 if __name__ == "__main__":
     main()
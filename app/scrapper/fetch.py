@@ -0,0 +1,117 @@
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlparse
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/118.0 Safari/537.36')
+
+
+class HttpFetcher:
+    """
+    Pooled keep-alive HTTP client for pages that do not need JavaScript.
+    Remembers ETag/Last-Modified validators per URL and re-uses the cached
+    body when the server answers a conditional GET with 304 Not Modified.
+    """
+
+    def __init__(self, pool_size=8, timeout=10, max_cached_pages=256):
+        self.timeout = timeout
+        self.max_cached_pages = max_cached_pages
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'pl-PL,pl;q=0.9'})
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._validators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch(self, url):
+        """
+        Returns (html, not_modified) or (None, False) when the page could not
+        be fetched with a 200/304 response.
+        """
+        with self._lock:
+            cached = self._validators.get(url)
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning(f'HTTP fetch failed for {url}: {e}')
+            return None, False
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self._validators.move_to_end(url)
+            return cached[2], True
+        if response.status_code != 200:
+            logging.info(f'HTTP fetch for {url} returned status code {response.status_code}')
+            return None, False
+
+        if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+        html = response.text
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with self._lock:
+                self._validators[url] = (etag, last_modified, html)
+                self._validators.move_to_end(url)
+                while len(self._validators) > self.max_cached_pages:
+                    self._validators.popitem(last=False)
+        return html, False
+
+    def close(self):
+        self.session.close()
+
+
+class FetchStats:
+    """
+    Per-domain counters of which fetch path produced a page:
+    'http' (plain request), 'not_modified' (304 served from cache),
+    'selenium' (fallback render) and 'failed'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._seconds = defaultdict(lambda: defaultdict(float))
+
+    def record(self, url, path, seconds):
+        domain = urlparse(url).netloc
+        with self._lock:
+            self._counts[domain][path] += 1
+            self._seconds[domain][path] += seconds
+
+    def summary(self):
+        with self._lock:
+            return {
+                domain: {
+                    path: {
+                        'count': count,
+                        'avg_ms': round(1000 * self._seconds[domain][path] / count, 1)
+                    }
+                    for path, count in paths.items()
+                }
+                for domain, paths in self._counts.items()
+            }
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import threading
+
+
+def fingerprint_links(urls):
+    """Order-independent hash of a section's extracted link set."""
+    return hashlib.sha1('\n'.join(sorted(set(urls))).encode('utf-8')).hexdigest()
+
+
+def section_priority(priorities, section, levels):
+    """Priority of a section; sections without a configured one get the lowest of `levels`."""
+    return priorities.get(section, levels - 1)
+
+
+class SectionScheduler:
+    """
+    Decides which section listing pages a scraper run visits. Each section
+    has a revisit interval: it doubles (`backoff`) up to the section's
+    maximum when a visit finds the same link set as the previous one, and
+    halves down to `min_interval` when the link set changed. Sections are
+    visited in priority order (0 = highest) and the per-section state lives
+    in the `crawl_state` collection, so the intervals survive scraper
+    restarts. Article URLs that could not be fetched are remembered for
+    `failure_ttl` seconds, so a link that never parses (a video or gallery
+    page) is not retried on every visit.
+    """
+
+    def __init__(self, collection, priorities, min_interval=120, max_intervals=(600, 1800, 3600), backoff=2.0,
+                 failure_ttl=6 * 3600):
+        self.collection = collection
+        self.priorities = priorities
+        self.min_interval = min_interval
+        self.max_intervals = max_intervals
+        self.backoff = backoff
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._state = {}
+        try:
+            for doc in collection.find({'_id': {'$in': list(priorities)}}):
+                self._state[doc['_id']] = doc
+        except Exception as e:
+            # Without the stored state every section is due, as before the scheduler existed
+            logging.error(f'Error loading crawl state from MongoDB, visiting all sections: {e}')
+
+    def priority(self, section):
+        return section_priority(self.priorities, section, len(self.max_intervals))
+
+    def max_interval(self, section):
+        return self.max_intervals[min(self.priority(section), len(self.max_intervals) - 1)]
+
+    def fingerprint(self, section):
+        with self._lock:
+            return self._state.get(section, {}).get('fingerprint')
+
+    def due_sections(self, now=None):
+        """Sections whose revisit time has come, highest priority first."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            due = [section for section in self.priorities
+                   if self._state.get(section, {}).get('next_visit_at', now) <= now]
+        return sorted(due, key=self.priority)
+
+    def record_visit(self, section, urls, new_count, now=None):
+        """
+        Updates the section's interval after a visit that extracted `urls`,
+        `new_count` of them not stored yet, and persists it. The interval
+        follows the link set: it shrinks when the fingerprint changed and
+        grows when it did not. A failed visit (no URLs) keeps the interval.
+        Returns the new interval in seconds.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            state = dict(self._state.get(section) or {'_id': section, 'interval_seconds': self.min_interval})
+            interval = state['interval_seconds']
+            fingerprint = fingerprint_links(urls) if urls else state.get('fingerprint')
+            if urls and fingerprint != state.get('fingerprint'):
+                interval = max(self.min_interval, interval / self.backoff)
+                state['last_changed_at'] = now
+            elif urls:
+                interval = min(self.max_interval(section), interval * self.backoff)
+            if new_count:
+                state['last_new_at'] = now
+            state.update({
+                'priority': self.priority(section),
+                'fingerprint': fingerprint,
+                'interval_seconds': interval,
+                'last_visit_at': now,
+                'next_visit_at': now + timedelta(seconds=interval),
+                'visits': state.get('visits', 0) + 1,
+            })
+            self._state[section] = state
+        self._save(section, state)
+        return interval
+
+    def _save(self, section, state):
+        try:
+            self.collection.replace_one({'_id': section}, state, upsert=True)
+        except Exception as e:
+            logging.error(f'Error saving crawl state of {section}: {e}')
+
+    def recent_failures(self, now=None):
+        """Article URLs of any section whose fetch failed less than `failure_ttl` seconds ago."""
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=self.failure_ttl)
+        with self._lock:
+            return {failure['url'] for state in self._state.values()
+                    for failure in state.get('failed_urls', []) if failure['at'] > cutoff}
+
+    def record_failures(self, section, urls, now=None):
+        """Remembers the section's article URLs that could not be fetched or parsed, dropping expired ones."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.failure_ttl)
+        with self._lock:
+            state = dict(self._state.get(section) or {'_id': section, 'interval_seconds': self.min_interval})
+            failures = {failure['url']: failure for failure in state.get('failed_urls', []) if failure['at'] > cutoff}
+            failures.update((url, {'url': url, 'at': now}) for url in urls)
+            state['failed_urls'] = list(failures.values())
+            self._state[section] = state
+        self._save(section, state)
+
+    def summary(self):
+        with self._lock:
+            return {section: round(state['interval_seconds']) for section, state in self._state.items()}
@@ -0,0 +1,143 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+import logging
+import threading
+import time
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def ensure_indexes(collection):
+    """
+    Creates the indexes the scrapers and the RAG updater rely on: a unique
+    index on `url` (dedupe lookups and upserts) and one on `scraped_at`
+    (date-range loads). Safe to call on every startup.
+    """
+    try:
+        collection.create_index('url', unique=True, name='url_unique')
+    except OperationFailure as e:
+        if e.code != DUPLICATE_KEY_ERROR:
+            raise
+        logging.error('Collection already contains duplicate URLs, creating a non-unique url index instead. '
+                      f'Remove the duplicates to enable the unique index: {e}')
+        collection.create_index('url', name='url')
+    collection.create_index('scraped_at', name='scraped_at')
+
+
+class ArticleWriter:
+    """
+    Buffers scraped articles and writes them with a single unordered
+    bulk_write of upserts keyed by URL. An existing article is never
+    overwritten ($setOnInsert), so concurrent scrapers cannot race on a
+    check-then-insert. The buffer is flushed when it reaches `batch_size`
+    articles or its oldest article is older than `flush_interval` seconds;
+    a background timer enforces the latter even when no further article
+    arrives. close() stops the timer and flushes what is left.
+
+    With an `events` collection, the IDs of the articles each flush
+    inserted are appended to it, so the RAG updater can pick them up at once.
+    """
+
+    def __init__(self, collection, batch_size=50, flush_interval=5.0, events=None):
+        self.collection = collection
+        self.events = events
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'flushes': 0, 'inserted': 0, 'existing': 0, 'failed': 0, 'seconds': 0.0}
+
+    def add(self, article):
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+                self._changed.notify()
+                if self._timer is None and not self._closed:
+                    self._timer = threading.Thread(target=self._flush_when_due, name='article-flush', daemon=True)
+                    self._timer.start()
+            self._buffer.setdefault(article['url'], article)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._oldest >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def _flush_when_due(self):
+        while True:
+            with self._changed:
+                while not self._closed and (self._oldest is None
+                                            or time.monotonic() - self._oldest < self.flush_interval):
+                    self._changed.wait(None if self._oldest is None
+                                       else self._oldest + self.flush_interval - time.monotonic())
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        if self._timer is not None:
+            self._timer.join()
+        self.flush()
+
+    def flush(self):
+        # Only one flush talks to MongoDB at a time; adds keep filling a fresh buffer meanwhile
+        with self._flush_lock:
+            with self._lock:
+                articles = list(self._buffer.values())
+                self._buffer = {}
+                self._oldest = None
+            if not articles:
+                return
+
+            operations = [
+                UpdateOne({'url': article['url']}, {'$setOnInsert': article}, upsert=True)
+                for article in articles
+            ]
+            started = time.monotonic()
+            inserted, existing, failed = 0, 0, 0
+            inserted_ids = []
+            try:
+                result = self.collection.bulk_write(operations, ordered=False)
+                inserted = result.upserted_count
+                existing = result.matched_count
+                inserted_ids = list(result.upserted_ids.values())
+            except BulkWriteError as e:
+                details = e.details
+                inserted = details.get('nUpserted', 0)
+                existing = details.get('nMatched', 0)
+                inserted_ids = [upserted['_id'] for upserted in details.get('upserted', [])]
+                for error in details.get('writeErrors', []):
+                    # A concurrent upsert of the same URL won the race; the article is stored
+                    if error.get('code') == DUPLICATE_KEY_ERROR:
+                        existing += 1
+                    else:
+                        failed += 1
+                        logging.error(f'Error storing article in MongoDB: {error.get("errmsg")}')
+            except Exception as e:
+                failed = len(articles)
+                logging.error(f'Error flushing {len(articles)} articles to MongoDB: {e}')
+            if inserted_ids and self.events is not None:
+                try:
+                    self.events.insert_one({'article_ids': inserted_ids, 'created_at': datetime.utcnow()})
+                except Exception as e:
+                    # The --follow updater's periodic catch-up load still finds these articles by scraped_at
+                    logging.error(f'Error writing article event: {e}')
+            elapsed = time.monotonic() - started
+
+            self.stats['flushes'] += 1
+            self.stats['inserted'] += inserted
+            self.stats['existing'] += existing
+            self.stats['failed'] += failed
+            self.stats['seconds'] += elapsed
+            logging.info(f'Flushed {len(articles)} articles to MongoDB in {elapsed * 1000:.1f} ms '
+                         f'(inserted: {inserted}, already stored: {existing}, failed: {failed}).')
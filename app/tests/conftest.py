@@ -0,0 +1,28 @@
+import pytest
+
+import rag.chunking
+
+
+class ByteEncoding:
+    """Offline stand-in for the tiktoken encoding: one token per UTF-8 byte."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="ignore")
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    # tiktoken downloads its encoding on first use
+    monkeypatch.setattr(rag.chunking, "get_encoding", lambda: ByteEncoding())
+
+
+@pytest.fixture
+def vectorstore(tmp_path):
+    from langchain_community.vectorstores import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return Chroma(embedding_function=DeterministicFakeEmbedding(size=16),
+                  persist_directory=str(tmp_path / "chroma"))
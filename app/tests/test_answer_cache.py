@@ -0,0 +1,27 @@
+from backend.answer_cache import AnswerCache
+
+
+class SameVectorEmbeddings:
+    """Embeds every question identically, the worst case for the semantic tier."""
+
+    def embed_query(self, query):
+        return [1.0, 0.0, 0.0]
+
+
+def test_semantic_hit_requires_the_same_sports():
+    cache = AnswerCache(SameVectorEmbeddings())
+    cache.store("Co nowego w tenisie?", None, {"answer": "tenis", "sources": []}, 1.0)
+
+    response, tier, _ = cache.lookup("Co nowego w siatkówce?")
+    assert response is None
+
+    response, tier, _ = cache.lookup("Jakie są najnowsze wiadomości z tenisa?")
+    assert (response["answer"], tier) == ("tenis", "semantic")
+
+
+def test_exact_hit_ignores_the_semantic_threshold():
+    cache = AnswerCache(SameVectorEmbeddings(), max_distance=0)
+    cache.store("Co nowego w tenisie?", None, {"answer": "tenis", "sources": []}, 1.0)
+
+    response, tier, _ = cache.lookup("co nowego w tenisie")
+    assert (response["answer"], tier) == ("tenis", "exact")
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from rag.digests import DigestStore, match_digest_query, refresh_digests, save_digests
+
+
+class StubCollection:
+    """Answers the Chroma `get` filter used by freshest_articles from a list of chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, where, include):
+        sport, scraped, chunk_index = (condition for condition in where["$and"])
+        matched = [
+            (text, metadata) for text, metadata in self.chunks
+            if metadata["sport"] == sport["sport"]
+            and metadata["scraped_ts"] >= scraped["scraped_ts"]["$gte"]
+            and metadata["chunk_index"] == chunk_index["chunk_index"]
+        ]
+        return {"documents": [text for text, _ in matched], "metadatas": [metadata for _, metadata in matched]}
+
+
+class StubLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return f"Podsumowanie {len(self.prompts)}"
+
+
+def chunk(sport, parent_id, hours_ago):
+    return f"Treść {parent_id}", {"sport": sport, "parent_id": parent_id, "chunk_index": 0, "title": parent_id,
+                                  "scraped_ts": time.time() - hours_ago * 3600}
+
+
+@pytest.mark.parametrize("question, sport", [
+    ("Co nowego w tenisie?", "tenis"),
+    ("najnowsze wiadomości z siatkówki", "siatkowka"),
+    ("Co słychać w piłce nożnej?", "pilka-nozna"),
+    ("Podsumuj ostatnie wydarzenia w koszykówce", "koszykowka"),
+])
+def test_match_digest_query_generic(question, sport):
+    assert match_digest_query(question) == sport
+
+
+@pytest.mark.parametrize("question", [
+    "Co nowego u Igi Świątek w tenisie?",
+    "Jak zagrała Legia w piłce nożnej?",
+    "Co nowego w tenisie i siatkówce?",
+    "Co nowego?",
+])
+def test_match_digest_query_specific(question):
+    assert match_digest_query(question) is None
+
+
+def test_refresh_digests_reuses_unchanged_articles(tmp_path):
+    collection = StubCollection([chunk("tenis", "t1", 2), chunk("tenis", "t2", 1), chunk("siatkowka", "s1", 30)])
+    llm = StubLLM()
+
+    first = refresh_digests(llm, collection, str(tmp_path), generation=1, sports=["tenis", "siatkowka"])
+    assert list(first["digests"]) == ["tenis"]
+    assert first["regenerated"] == 1
+
+    second = refresh_digests(llm, collection, str(tmp_path), generation=2, sports=["tenis", "siatkowka"])
+    assert second["regenerated"] == 0
+    assert len(llm.prompts) == 1
+    assert second["digests"]["tenis"]["answer"] == first["digests"]["tenis"]["answer"]
+
+    collection.chunks.append(chunk("tenis", "t3", 0))
+    third = refresh_digests(llm, collection, str(tmp_path), generation=3, sports=["tenis", "siatkowka"])
+    assert third["regenerated"] == 1
+    assert third["digests"]["tenis"]["answer"] == "Podsumowanie 2"
+
+
+def test_digest_store_serves_generic_questions_only(tmp_path):
+    refresh_digests(StubLLM(), StubCollection([chunk("tenis", "t1", 1)]), str(tmp_path), generation=1,
+                    sports=["tenis"])
+    store = DigestStore(str(tmp_path))
+
+    sport, digest = store.lookup("Co nowego w tenisie?")
+    assert sport == "tenis"
+    assert digest["answer"] == "Podsumowanie 1"
+    assert [source["parent_id"] for source in digest["sources"]] == ["t1"]
+    assert store.lookup("Co nowego u Huberta Hurkacza?") == (None, None)
+    assert store.stats()["sports"]["tenis"]["worker_hits"] == 1
+
+
+def test_digest_store_skips_expired_digests(tmp_path):
+    save_digests(str(tmp_path), {"digests": {"tenis": {"answer": "Stare", "sources": [],
+                                                        "expires_at": time.time() - 60}}})
+    assert DigestStore(str(tmp_path)).lookup("Co nowego w tenisie?") == (None, None)
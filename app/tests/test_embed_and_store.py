@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from rag.embed_and_store import chunk_id, content_hash, document_id, embed_and_store, process_articles
+
+URL = "https://sport.example/tenis/swiatek-rzym"
+
+
+def article(text, scraped_at=datetime(2026, 5, 18, 12, 0), url=URL):
+    return {"url": url, "title": "Świątek w finale", "text": text, "sport": "tenis", "scraped_at": scraped_at}
+
+
+def stored_ids(vectorstore, url=URL):
+    return set(vectorstore.get(where={"url": url})["ids"])
+
+
+def test_chunk_ids_are_deterministic():
+    text = "Iga Świątek awansowała do finału turnieju w Rzymie. " * 20
+    docs = process_articles([article(text)], chunk_size=200, chunk_overlap=20)
+
+    parent_id = document_id(URL, content_hash(text))
+    assert len(docs) > 1
+    assert [doc.metadata["parent_id"] for doc in docs] == [parent_id] * len(docs)
+    assert [doc.metadata["chunk_index"] for doc in docs] == list(range(len(docs)))
+    assert process_articles([article(text)], chunk_size=200, chunk_overlap=20) == docs
+    assert chunk_id(parent_id, 0) == f"{parent_id}-0"
+
+
+def test_embed_and_store_counts_new_skipped_and_updated_articles(vectorstore, tmp_path):
+    persist_directory = str(tmp_path / "chroma")
+    first = process_articles([article("Świątek wygrała półfinał."), article("Hurkacz odpadł.", url=URL + "-2")])
+
+    assert embed_and_store(first, persist_directory, vectorstore) == {
+        "new": 2, "updated": 0, "skipped": 0, "chunks": 2}
+    assert stored_ids(vectorstore) == {chunk_id(first[0].metadata["parent_id"], 0)}
+
+    assert embed_and_store(first, persist_directory, vectorstore) == {
+        "new": 0, "updated": 0, "skipped": 2, "chunks": 0}
+
+    edited = process_articles([article("Świątek wygrała półfinał i zagra o tytuł.")])
+    assert embed_and_store(edited, persist_directory, vectorstore) == {
+        "new": 0, "updated": 1, "skipped": 0, "chunks": 1}
+    # The previous version of the article is removed once the new one is stored
+    assert stored_ids(vectorstore) == {chunk_id(edited[0].metadata["parent_id"], 0)}
+    assert stored_ids(vectorstore, URL + "-2") == {chunk_id(first[1].metadata["parent_id"], 0)}
+
+
+def test_embed_and_store_keeps_only_the_newest_version_of_a_url_in_one_batch(vectorstore, tmp_path):
+    newer = article("Świątek zagra o tytuł.", scraped_at=datetime(2026, 5, 18, 13, 0))
+    older = article("Świątek w półfinale.", scraped_at=datetime(2026, 5, 18, 12, 0))
+    docs = process_articles([newer, older])
+
+    stats = embed_and_store(docs, str(tmp_path / "chroma"), vectorstore)
+
+    assert stats == {"new": 1, "updated": 0, "skipped": 0, "chunks": 1}
+    assert stored_ids(vectorstore) == {chunk_id(docs[0].metadata["parent_id"], 0)}
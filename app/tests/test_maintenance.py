@@ -0,0 +1,40 @@
+import time
+
+from langchain_core.documents import Document
+
+from rag.maintenance import run_maintenance
+
+DAY = 24 * 3600
+
+
+def store(vectorstore):
+    now = time.time()
+    vectorstore.add_documents([
+        Document(page_content="Nowy artykuł", metadata={"url": "https://sport.example/nowy", "scraped_ts": now}),
+        Document(page_content="Stary artykuł", metadata={"url": "https://sport.example/stary",
+                                                         "scraped_ts": now - 100 * DAY}),
+        # Stored before chunks carried scraped_ts
+        Document(page_content="Artykuł bez daty", metadata={"url": "https://sport.example/legacy"}),
+    ], ids=["nowy", "stary", "legacy"])
+    return now
+
+
+def test_chunks_without_scraped_ts_expire_from_the_legacy_time(vectorstore, tmp_path):
+    now = store(vectorstore)
+
+    report = run_maintenance(vectorstore, str(tmp_path / "chroma"), retention_days=90,
+                             legacy_scraped_ts=now - 95 * DAY)
+
+    assert report["expired_removed"] == 2
+    assert vectorstore._collection.get()["ids"] == ["nowy"]
+    assert report["after"]["hnsw_bytes"] <= report["after"]["bytes"]
+
+
+def test_chunks_without_scraped_ts_are_kept_within_retention(vectorstore, tmp_path):
+    now = store(vectorstore)
+
+    report = run_maintenance(vectorstore, str(tmp_path / "chroma"), retention_days=90,
+                             legacy_scraped_ts=now - 10 * DAY)
+
+    assert report["expired_removed"] == 1
+    assert sorted(vectorstore._collection.get()["ids"]) == ["legacy", "nowy"]
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import rag.config
+from backend.answer_cache import AnswerCache
+from backend.qa import stream_answer
+
+DOCS = [Document(page_content="Świątek wygrała finał w Rzymie.",
+                 metadata={"url": "https://sport.example/a/1", "title": "Finał w Rzymie"})]
+
+
+class StubRetriever:
+    def invoke(self, question, timer=None):
+        return list(DOCS)
+
+
+class FailingChatModel(FakeListChatModel):
+    def _stream(self, *args, **kwargs):
+        raise RuntimeError("LLM niedostępny")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(rag.config, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(rag.config, "EMBEDDING_BACKEND", "openai")
+    monkeypatch.setenv("VECTORSTORE_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setenv("CONVERSATION_DB_PATH", "")
+    monkeypatch.setattr(rag.config, "EMBEDDING_CACHE_PATH", "")
+    app_module = pytest.importorskip("backend.app")
+    monkeypatch.setattr(app_module, "retriever", StubRetriever())
+    monkeypatch.setattr(app_module, "answer_cache", AnswerCache(DeterministicFakeEmbedding(size=16)))
+    monkeypatch.setattr(app_module, "digests", None)
+    return app_module, app_module.app.test_client()
+
+
+def stream_events(client, question):
+    response = client.post("/query/stream", json={"query": question})
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_answer_yields_sources_then_tokens_then_done():
+    llm = FakeListChatModel(responses=["Iga Świątek wygrała."])
+
+    events = list(stream_answer(llm, StubRetriever(), "Kto wygrał w Rzymie?"))
+
+    assert events[0] == {"type": "sources", "sources": [DOCS[0].metadata]}
+    assert {event["type"] for event in events[1:-1]} == {"token"}
+    assert events[-1] == {"type": "done", "answer": "Iga Świątek wygrała."}
+    assert "".join(event["token"] for event in events[1:-1]) == events[-1]["answer"]
+
+
+def test_query_stream_endpoint_streams_the_answer(client, monkeypatch):
+    app_module, http = client
+    monkeypatch.setattr(app_module, "llm", FakeListChatModel(responses=["Iga Świątek wygrała."]))
+
+    events = stream_events(http, "Kto wygrał turniej w Rzymie?")
+
+    assert [event["type"] for event in events][0] == "sources"
+    assert events[-1]["type"] == "done"
+    assert events[-1]["answer"] == "Iga Świątek wygrała."
+
+
+def test_query_stream_endpoint_reports_llm_errors(client, monkeypatch):
+    app_module, http = client
+    monkeypatch.setattr(app_module, "llm", FailingChatModel(responses=["nieużywane"]))
+
+    events = stream_events(http, "Kto wygrał turniej w Rzymie?")
+
+    assert events[0]["type"] == "sources"
+    assert events[-1] == {"type": "error", "error": "LLM niedostępny"}
+    assert "done" not in [event["type"] for event in events]
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+import run_rag_update
+from rag.ingest_state import load_state
+
+
+class FakeFeed:
+    """In-process stand-in for the event-log feed: hands out prepared batches, then stops the loop."""
+
+    state_key = "event_log_position"
+
+    def __init__(self, batches, stop):
+        self.batches = list(batches)
+        self.stop = stop
+        self.position = None
+
+    def poll(self, max_items, max_wait):
+        if not self.batches:
+            self.stop.set()
+            return []
+        self.position, articles = self.batches.pop(0)
+        return articles
+
+
+def article(url, text):
+    return {"url": url, "title": f"Tytuł {url}", "text": text, "sport": "tenis", "scraped_at": datetime.utcnow()}
+
+
+@pytest.fixture
+def updater(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_rag_update, "VECTORSTORE_DIR", str(tmp_path))
+    monkeypatch.setattr(run_rag_update, "FOLLOW_RETRY_SECONDS", 0)
+    monkeypatch.setattr(run_rag_update, "FOLLOW_CATCH_UP_INTERVAL_SECONDS", 3600)
+    return tmp_path
+
+
+def test_follow_embeds_new_articles_and_saves_the_position_after_ingest(updater, vectorstore, monkeypatch):
+    stop = run_rag_update.threading.Event()
+    feed = FakeFeed([("event-1", [article("https://sport.example/a/1", "Świątek wygrała finał turnieju.")])], stop)
+    ingest = run_rag_update.ingest
+    attempts = []
+
+    def failing_once(articles, state, vectorstore=None):
+        attempts.append(load_state(str(updater)).get(feed.state_key))
+        if len(attempts) == 1:
+            raise RuntimeError("embedding API unavailable")
+        return ingest(articles, state, vectorstore)
+
+    monkeypatch.setattr(run_rag_update, "ingest", failing_once)
+    run_rag_update.follow({}, feed, stop, vectorstore)
+
+    # The failed attempt did not save the position; the retry stored the same batch
+    assert attempts == [None, None]
+    state = load_state(str(updater))
+    assert state[feed.state_key] == "event-1"
+    assert state["generation"] == 1
+    stored = vectorstore.get(where={"url": "https://sport.example/a/1"}, include=["metadatas"])
+    assert stored["ids"] and stored["metadatas"][0]["sport"] == "tenis"
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from scrapper.scheduler import SectionScheduler
+
+NOW = datetime(2026, 1, 1, 12)
+
+
+def scheduler():
+    collection = mongomock.MongoClient()["scraper_db"]["crawl_state"]
+    return SectionScheduler(collection, {"/tenis": 0}, min_interval=100, max_intervals=(800,), failure_ttl=3600)
+
+
+def test_interval_follows_the_link_fingerprint_not_unstored_urls():
+    sections = scheduler()
+    assert sections.record_visit("/tenis", ["/a/1", "/a/wideo"], 2, NOW) == 100
+    # The video link is never stored, but the listing did not change
+    assert sections.record_visit("/tenis", ["/a/wideo", "/a/1"], 1, NOW + timedelta(seconds=100)) == 200
+    assert sections.record_visit("/tenis", ["/a/1", "/a/wideo"], 1, NOW + timedelta(seconds=300)) == 400
+    assert sections.record_visit("/tenis", ["/a/2", "/a/1", "/a/wideo"], 1, NOW + timedelta(seconds=700)) == 200
+
+
+def test_failed_urls_expire_and_survive_a_restart():
+    sections = scheduler()
+    sections.record_failures("/tenis", ["/a/wideo"], NOW)
+
+    reloaded = SectionScheduler(sections.collection, {"/tenis": 0}, failure_ttl=3600)
+    assert reloaded.recent_failures(NOW + timedelta(minutes=30)) == {"/a/wideo"}
+    assert reloaded.recent_failures(NOW + timedelta(hours=2)) == set()
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("selenium")
+
+from selenium.common.exceptions import WebDriverException
+
+import scrapper.scrap_sports as scrap_sports
+
+ROOT_URL = "https://sport.example"
+
+
+def listing(paths):
+    links = "".join(f'<a href="{path}">link</a>' for path in paths)
+    return f'<section class="box-one-two-and-list boxes-section">{links}</section>'
+
+
+def article(path):
+    return f'<h1 class="news-heading__title">Tytuł {path}</h1><div class="news__container">Treść {path}</div>'
+
+
+class NoHttpFetcher:
+    """Makes every page fall back to Selenium."""
+
+    def fetch(self, url):
+        return None, False
+
+    def close(self):
+        pass
+
+
+class StubDriver:
+    def __init__(self, pages, visits, failures):
+        self.pages = pages
+        self.visits = visits
+        self.failures = failures
+        self.page_source = ""
+
+    def get(self, url):
+        if self.failures.get(url):
+            self.failures[url] -= 1
+            raise WebDriverException("session deleted")
+        self.visits.append(url)
+        self.page_source = self.pages[url]
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    # mongomock has no capped collections
+    monkeypatch.setattr(scrap_sports, "ensure_event_log", lambda db: db["article_events"])
+    return mongomock.MongoClient()
+
+
+def run(mongo, pages, sections, failures=None, scheduler=None):
+    visits, drivers = [], []
+
+    def driver_factory():
+        drivers.append(StubDriver(pages, visits, failures if failures is not None else {}))
+        return drivers[-1]
+
+    scrap_sports.scrap(num_sessions=1, driver_factory=driver_factory, root_url=ROOT_URL, sections=sections,
+                       fetcher=NoHttpFetcher(), scheduler=scheduler, mongo_client=mongo)
+    return visits, drivers
+
+
+def test_scrap_fetches_each_unseen_article_once(mongo):
+    pages = {
+        ROOT_URL + "/pilka-nozna": listing(["/a/gol", "/a/wspolny"]),
+        ROOT_URL + "/siatkowka": listing(["/a/wspolny", "/a/zapisany"]),
+        ROOT_URL + "/a/gol": article("/a/gol"),
+        ROOT_URL + "/a/wspolny": article("/a/wspolny"),
+    }
+    articles = mongo["scraper_db"]["articles"]
+    articles.insert_one({"url": ROOT_URL + "/a/zapisany", "title": "Stary", "text": "Stary"})
+
+    visits, _ = run(mongo, pages, ["/pilka-nozna", "/siatkowka"])
+
+    fetched = [url for url in visits if "/a/" in url]
+    assert sorted(fetched) == [ROOT_URL + "/a/gol", ROOT_URL + "/a/wspolny"]
+    assert articles.count_documents({}) == 3
+    assert articles.find_one({"url": ROOT_URL + "/a/gol"})["sport"] == "pilka-nozna"
+    assert scrap_sports.client is None
+
+
+def test_scrap_recreates_the_driver_after_a_selenium_error(mongo):
+    pages = {
+        ROOT_URL + "/siatkowka": listing(["/a/mecz"]),
+        ROOT_URL + "/a/mecz": article("/a/mecz"),
+    }
+
+    visits, drivers = run(mongo, pages, ["/siatkowka"], failures={ROOT_URL + "/a/mecz": 1})
+
+    assert len(drivers) == 2
+    assert visits == [ROOT_URL + "/siatkowka", ROOT_URL + "/a/mecz"]
+    assert mongo["scraper_db"]["articles"].find_one({"url": ROOT_URL + "/a/mecz"})["title"] == "Tytuł /a/mecz"
+
+
+def test_scrap_skips_recently_failed_articles(mongo):
+    from scrapper.scheduler import SectionScheduler
+
+    pages = {
+        ROOT_URL + "/siatkowka": listing(["/a/wideo"]),
+        ROOT_URL + "/a/wideo": "<video></video>",
+    }
+    sections = SectionScheduler(mongo["scraper_db"]["crawl_state"], {"/siatkowka": 0})
+
+    visits, _ = run(mongo, pages, ["/siatkowka"], scheduler=sections)
+    assert ROOT_URL + "/a/wideo" in visits
+
+    visits, _ = run(mongo, pages, ["/siatkowka"], scheduler=sections)
+    assert visits == [ROOT_URL + "/siatkowka"]
+
+
+def test_scrap_worker_survives_an_error_in_one_article(mongo, monkeypatch):
+    pages = {
+        ROOT_URL + "/tenis": listing(["/a/zepsuty", "/a/dobry"]),
+        ROOT_URL + "/a/zepsuty": article("/a/zepsuty"),
+        ROOT_URL + "/a/dobry": article("/a/dobry"),
+    }
+    save_article = scrap_sports.save_article
+
+    def failing_save_article(item):
+        if item["url"].endswith("/a/zepsuty"):
+            raise ValueError("uszkodzony artykuł")
+        save_article(item)
+
+    monkeypatch.setattr(scrap_sports, "save_article", failing_save_article)
+    # A worker dying on the error would leave scrap() waiting on the queue forever
+    worker = threading.Thread(target=run, args=(mongo, pages, ["/tenis"]), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+
+    assert not worker.is_alive()
+    articles = mongo["scraper_db"]["articles"]
+    assert articles.find_one({"url": ROOT_URL + "/a/dobry"}) is not None
+    assert articles.find_one({"url": ROOT_URL + "/a/zepsuty"}) is None
@@ -0,0 +1,58 @@
+import pickle
+
+from langchain_core.documents import Document
+
+from rag.bm25_index import BM25Index
+from rag.hybrid_retriever import build_filter
+from rag.maintenance import backfill_sport
+from rag.sports import UNTAGGED
+from rag.vector_index import VectorIndex, export_vector_index
+
+CHUNKS = {
+    "tenis": ("Świątek wygrała finał w Rzymie", {"url": "https://sport.example/1", "sport": "tenis"}),
+    "siatkowka": ("Finał PlusLigi w Rzeszowie", {"url": "https://sport.example/2", "sport": "siatkowka"}),
+    # meczyki.pl articles and chunks stored before sports were tagged
+    "untagged": ("Finał Ligi Mistrzów w Monachium", {"url": "https://meczyki.example/3"}),
+}
+
+
+def test_bm25_sport_filter_keeps_untagged_chunks():
+    index = BM25Index()
+    for doc_id, (text, metadata) in CHUNKS.items():
+        index.add(doc_id, text, metadata)
+
+    found = {doc_id for doc_id, _ in index.search("finał", 10, sports=["tenis"])}
+
+    assert found == {"tenis", "untagged"}
+
+
+def test_bm25_index_pickled_without_untagged_ids_is_regrouped():
+    index = BM25Index()
+    for doc_id, (text, metadata) in CHUNKS.items():
+        index.add(doc_id, text, metadata)
+    state = index.__getstate__()
+    state["sport_ids"] = {"tenis": {"tenis"}, "siatkowka": {"siatkowka"}}
+    index.__dict__.update(state)
+
+    loaded = pickle.loads(pickle.dumps(index))
+
+    assert {doc_id for doc_id, _ in loaded.search("finał", 10, sports=["tenis"])} == {"tenis", "untagged"}
+
+
+def test_chroma_filter_and_vector_index_keep_backfilled_untagged_chunks(vectorstore, tmp_path):
+    persist_directory = str(tmp_path / "chroma")
+    vectorstore.add_documents([Document(page_content=text, metadata=metadata) for text, metadata in CHUNKS.values()],
+                              ids=list(CHUNKS))
+
+    assert backfill_sport(vectorstore._collection) == 1
+    assert backfill_sport(vectorstore._collection) == 0
+    stored = vectorstore._collection.get(ids=["untagged"])["metadatas"][0]
+    assert stored == {"url": "https://meczyki.example/3", "sport": UNTAGGED}
+
+    found = vectorstore._collection.get(where=build_filter(["tenis"], None))["ids"]
+    assert set(found) == {"tenis", "untagged"}
+
+    export_vector_index(persist_directory, vectorstore._collection, "float32")
+    index = VectorIndex.open(persist_directory)
+    hits = index.search_documents([[1.0] * 16], 10, sports=["tenis"])[0]
+    assert {doc.id for doc in hits} == {"tenis", "untagged"}
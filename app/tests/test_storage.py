@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from scrapper.storage import ArticleWriter
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_timer_flushes_the_last_articles_without_another_add():
+    collection = mongomock.MongoClient()["scraper_db"]["articles"]
+    writer = ArticleWriter(collection, batch_size=50, flush_interval=0.1)
+
+    writer.add({"url": "https://sport.example/a/1", "title": "Tytuł", "text": "Treść"})
+
+    assert wait_for(lambda: collection.count_documents({}) == 1)
+    assert writer.stats["flushes"] == 1
+    writer.close()
+
+
+def test_close_flushes_the_buffer_and_stops_the_timer():
+    collection = mongomock.MongoClient()["scraper_db"]["articles"]
+    writer = ArticleWriter(collection, batch_size=50, flush_interval=60)
+
+    writer.add({"url": "https://sport.example/a/1", "title": "Tytuł", "text": "Treść"})
+    writer.add({"url": "https://sport.example/a/1", "title": "Duplikat", "text": "Treść"})
+    writer.close()
+
+    assert collection.count_documents({}) == 1
+    assert collection.find_one()["title"] == "Tytuł"
+    assert not writer._timer.is_alive()
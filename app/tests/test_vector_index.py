@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from rag.ingest_state import store_lock
+from rag.vector_index import VectorIndex, export_vector_index
+
+
+class GrowingCollection:
+    """Collection that gains a chunk between count() and the pages being read, like one the updater writes to."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self):
+        count = self.collection.count()
+        self.collection.add(ids=["late"], embeddings=[[1.0] * 16], documents=["Późny artykuł"],
+                            metadatas=[{"url": "https://sport.example/late"}])
+        return count
+
+    def get(self, **kwargs):
+        return self.collection.get(**kwargs)
+
+
+def add_chunks(vectorstore, count):
+    vectorstore.add_documents(
+        [Document(page_content=f"Artykuł {i}", metadata={"url": f"https://sport.example/{i}", "sport": "tenis"})
+         for i in range(count)],
+        ids=[f"chunk-{i}" for i in range(count)]
+    )
+
+
+def test_export_does_not_wait_for_the_store_lock(vectorstore, tmp_path):
+    persist_directory = str(tmp_path / "chroma")
+    add_chunks(vectorstore, 3)
+
+    # The updater stores batches under the store lock while the index is exported
+    with store_lock(persist_directory):
+        manifest = export_vector_index(persist_directory, vectorstore._collection, "float32")
+
+    assert manifest["count"] == 3
+    assert len(VectorIndex.open(persist_directory)) == 3
+
+
+def test_export_ignores_chunks_stored_after_the_count(vectorstore, tmp_path):
+    persist_directory = str(tmp_path / "chroma")
+    add_chunks(vectorstore, 3)
+
+    manifest = export_vector_index(persist_directory, GrowingCollection(vectorstore._collection), "int8")
+
+    assert manifest["count"] == 3
+    assert vectorstore._collection.count() == 4
+    assert len(VectorIndex.open(persist_directory)) == 3